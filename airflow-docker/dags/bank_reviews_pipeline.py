@@ -9,8 +9,8 @@ from airflow.operators.bash import BashOperator
 from airflow.providers.postgres.operators.postgres import PostgresOperator
 from airflow.providers.postgres.hooks.postgres import PostgresHook
 from airflow.utils.task_group import TaskGroup
-import subprocess
 import os
+import sys
 
 default_args = {
     'owner': 'HABA',
@@ -36,58 +36,66 @@ dag = DAG(
 # Since we're in Docker, we'll use different paths
 PROJECT_PATH = '/opt/airflow/project'
 
+# The pipeline modules are imported in-process by the tasks below (imports are kept
+# inside the callables so DAG parsing does not pull in selenium/sklearn)
+if PROJECT_PATH not in sys.path:
+    sys.path.append(PROJECT_PATH)
+
+# Chrome drivers are memory hungry: every task that starts them takes slots in this
+# pool (created by airflow-init). The scrape step searches cities with SEARCH_WORKERS
+# drivers at once (passed to the scraper); the cleaning step runs ENRICH_WORKERS
+# drivers at once, matching ENRICH_MAX_WORKERS in data_cleaning_pipeline.py.
+SCRAPING_POOL = 'google_maps_scraping'
+SEARCH_WORKERS = 4
+ENRICH_WORKERS = 4
+
 # Task 1: Run web scraper
 def run_scraper(**context):
     """Execute the web scraper"""
-    result = subprocess.run(
-        ['python', f'{PROJECT_PATH}/google_maps_scraper.py'],
-        capture_output=True,
-        text=True,
-        cwd=PROJECT_PATH
-    )
-    if result.returncode != 0:
-        raise Exception(f"Scraper failed: {result.stderr}")
-    print(f"Scraper output: {result.stdout}")
+    from google_maps_scraper import main as scraper_main
+    # One run id ties all the files of this run together. Local time, like standalone
+    # runs, so the cleaning step's newest-file fallback orders both kinds of run alike
+    run_id = datetime.now().strftime('%Y%m%d_%H%M%S')
+    file_paths = scraper_main(run_id=run_id, max_search_workers=SEARCH_WORKERS)
+    context['task_instance'].xcom_push(key='file_paths', value=file_paths)
     context['task_instance'].xcom_push(key='scraper_status', value='completed')
 
 scrape_task = PythonOperator(
     task_id='scrape_reviews',
     python_callable=run_scraper,
+    pool=SCRAPING_POOL,
+    pool_slots=SEARCH_WORKERS,
     dag=dag
 )
 
 # Task 2: Data cleaning pipeline
 def run_cleaning(**context):
     """Execute data cleaning pipeline"""
-    result = subprocess.run(
-        ['python', f'{PROJECT_PATH}/data_cleaning_pipeline.py'],
-        capture_output=True,
-        text=True,
-        cwd=PROJECT_PATH
+    from data_cleaning_pipeline import main as cleaning_main
+    file_paths = context['task_instance'].xcom_pull(task_ids='scrape_reviews', key='file_paths') or {}
+    # Clean exactly the files of this run: never fall back to an older scrape
+    missing = [key for key in ('branches_file', 'reviews_file') if not file_paths.get(key)]
+    if missing:
+        raise ValueError(f"scrape_reviews did not report {', '.join(missing)}")
+    cleaning_main(
+        branches_file=file_paths['branches_file'],
+        reviews_file=file_paths['reviews_file']
     )
-    if result.returncode != 0:
-        raise Exception(f"Cleaning failed: {result.stderr}")
-    print(f"Cleaning output: {result.stdout}")
     context['task_instance'].xcom_push(key='cleaning_status', value='completed')
 
 clean_task = PythonOperator(
     task_id='clean_data',
     python_callable=run_cleaning,
+    pool=SCRAPING_POOL,
+    pool_slots=ENRICH_WORKERS,
     dag=dag
 )
 
 # Task 3: Load to PostgreSQL
 def load_to_staging(**context):
     """Load cleaned data to PostgreSQL staging"""
-    result = subprocess.run(
-        ['python', f'{PROJECT_PATH}/load_to_postgres.py'],
-        capture_output=True,
-        text=True,
-        cwd=PROJECT_PATH
-    )
-    if result.returncode != 0:
-        raise Exception(f"Loading failed: {result.stderr}")
-    print(f"Loading output: {result.stdout}")
+    from load_to_postgres import main as load_main
+    load_main()
     context['task_instance'].xcom_push(key='staging_status', value='completed')
 
 load_staging_task = PythonOperator(
@@ -99,15 +107,8 @@ load_staging_task = PythonOperator(
 # Task 4: NLP Analysis
 def run_nlp_analysis(**context):
     """Run sentiment analysis and topic modeling"""
-    result = subprocess.run(
-        ['python', f'{PROJECT_PATH}/nlp_analysis.py'],
-        capture_output=True,
-        text=True,
-        cwd=PROJECT_PATH
-    )
-    if result.returncode != 0:
-        raise Exception(f"NLP analysis failed: {result.stderr}")
-    print(f"NLP output: {result.stdout}")
+    from nlp_analysis import main as nlp_main
+    nlp_main()
     context['task_instance'].xcom_push(key='nlp_status', value='completed')
 
 nlp_task = PythonOperator(
@@ -124,7 +125,15 @@ dbt_run_task = BashOperator(
 )
 
 # Task 6: Data quality checks
-with TaskGroup('data_quality_checks', dag=dag) as quality_checks:
+# The checks are read-only and touch different tables: they run side by side in their
+# own pool (2 slots, created by airflow-init), with no dependency between them
+QUALITY_CHECKS_POOL = 'quality_checks'
+
+with TaskGroup(
+    'data_quality_checks',
+    dag=dag,
+    default_args={'pool': QUALITY_CHECKS_POOL, 'depends_on_past': False}
+) as quality_checks:
     
     check_review_count = PostgresOperator(
         task_id='check_review_count',
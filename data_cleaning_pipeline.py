@@ -3,68 +3,116 @@
 Data cleaning and enrichment pipeline for bank reviews data
 """
 import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
 import json
+import orjson
 import re
 import logging
-from datetime import datetime, timedelta
+from logging.handlers import RotatingFileHandler
+from datetime import datetime
+from collections import Counter
 from pathlib import Path
 from typing import Dict, List
 import sys
 import os
-import time
-from dateutil.relativedelta import relativedelta
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Add the directory containing scraper_utils to Python path
 sys.path.append('.')  # Adjust based on your project structure
 
-from scraper_utils import GoogleMapsUtils
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler('data_cleaning.log', encoding='utf-8')
-    ]
-)
+from scraper_utils import GoogleMapsHTTPUtils, GoogleMapsUtils
+
+# Configure logging, unless the host process (e.g. an Airflow worker) already did
+if not logging.getLogger().handlers:
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.StreamHandler(),
+            RotatingFileHandler('data_cleaning.log', maxBytes=10_000_000, backupCount=3,
+                                encoding='utf-8', delay=True)
+        ]
+    )
 logger = logging.getLogger(__name__)
 
+# Patterns for review text with weird symbols
+WEIRD_TEXT_PATTERN = re.compile('|'.join([
+    r'^[\s\n]*$',  # Empty or only whitespace/newlines
+    r'^[\W_]+$',   # Only non-word characters
+    r'^\s*[\u0000-\u001F\u007F-\u009F]+\s*$',  # Control characters
+]))
+ALPHA_CHAR_PATTERN = re.compile(r'[a-zA-Z]')
+
+# Google-Maps style relative dates (“a month ago”, “3 years ago”, “an hour ago” …)
+RELATIVE_DATE_PATTERN = re.compile(r"^(?P<n>a|an|\d+)\s+(?P<unit>year|month|week|day|hour|minute)")
+MONTHS_PER_UNIT = {"year": 12, "month": 1}
+MINUTES_PER_UNIT = {"week": 7 * 24 * 60, "day": 24 * 60, "hour": 60, "minute": 1}
+
+# Address enrichment concurrency (keep in sync with the Airflow scraping pool)
+ENRICH_MAX_WORKERS = 4
+ENRICH_SAVE_EVERY = 25  # scraped URLs between two saves of the URL-address mapping
+
+# Number of raw reviews processed at a time by the cleaning steps
+CLEANING_CHUNK_SIZE = 200_000
+
+# Repetitive review columns stored as pandas categoricals
+CATEGORICAL_COLUMNS = {'bank_name': 'category', 'branch_name': 'category'}
+# Their Parquet type: pandas picks the smallest index width per chunk (often int8),
+# so the width is fixed here for every chunk to fit the writer schema
+CATEGORICAL_ARROW_TYPE = pa.dictionary(pa.int32(), pa.string())
+
+# Free-text review columns read as strings, so a chunk where one of them is entirely
+# empty does not infer float64 and fix that type in the Parquet schema
+TEXT_COLUMNS = ['branch_address', 'branch_url', 'reviewer_name', 'review_text',
+                'review_date', 'response_from_owner', 'scraped_at']
+REVIEW_DTYPES = {**CATEGORICAL_COLUMNS, **dict.fromkeys(TEXT_COLUMNS, str)}
+
+# Pretty-printed JSON outputs (summary keys are years/ratings)
+JSON_DUMP_OPTIONS = orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
+
 
 class DataCleaningPipeline:
     """Main pipeline for cleaning and enriching bank data"""
     
-    def __init__(self, input_dir: str = "data/raw", output_dir: str = "data/cleaned"):
+    def __init__(self, input_dir: str = "data/raw", output_dir: str = "data/cleaned",
+                 branches_file: str = None, reviews_file: str = None):
         project_root = Path(__file__).resolve().parent       # folder where the .py file lives
         self.input_dir  = project_root / "data" / "raw"
         self.output_dir = project_root / "data" / "cleaned"
         self.output_dir.mkdir(parents=True, exist_ok=True)
         
-        # File paths
-        for f in os.listdir(self.input_dir):
-            if f.startswith("final_bank_branches") and f.endswith(".csv"):
-                self.branches_file = f
-                break
+        # File paths: given by the caller (e.g. the scraper run via XCom), otherwise
+        # the newest scraper output (file names end with a sortable timestamp)
+        if branches_file:
+            self.branches_file = Path(branches_file)
         else:
-            raise FileNotFoundError("No file starting with 'final_bank_branches' was found.")
-        for f in os.listdir(self.input_dir):
-            if f.startswith("final_bank_reviews") and f.endswith(".csv"):
-                self.reviews_file = f
-                break
+            branches = sorted(self.input_dir.glob("final_bank_branches*.csv"))
+            if not branches:
+                raise FileNotFoundError("No file starting with 'final_bank_branches' was found.")
+            self.branches_file = branches[-1]
+        if reviews_file:
+            self.reviews_file = Path(reviews_file)
         else:
-            raise FileNotFoundError("No file starting with 'final_bank_reviews' was found.")
+            reviews = sorted(self.input_dir.glob("final_bank_reviews*.csv"))
+            if not reviews:
+                raise FileNotFoundError("No file starting with 'final_bank_reviews' was found.")
+            self.reviews_file = reviews[-1]
         # self.branches_file = "final_bank_branches_20250604_104850.csv"
         # self.reviews_file = "final_bank_reviews_20250604_104850.csv"
         
         # URL to address mapping
         self.url_address_map = {}
         
-    def enrich_branch_addresses(self, limit: int = None) -> Dict[str, str]:
+    def enrich_branch_addresses(self, limit: int = None, max_workers: int = ENRICH_MAX_WORKERS) -> Dict[str, str]:
         """
         Step 1: Visit each branch URL and extract proper addresses
         
         Args:
             limit: Limit number of branches to process (for testing)
+            max_workers: Number of concurrent scrapers, each owning its own driver
             
         Returns:
             Dictionary mapping URL to address
@@ -72,57 +120,120 @@ class DataCleaningPipeline:
         logger.info("Starting branch address enrichment...")
         
         # Load branches CSV
-        branches_df = pd.read_csv(self.input_dir / self.branches_file)
+        branches_df = pd.read_csv(self.branches_file)
         logger.info(f"Loaded {len(branches_df)} branches")
         
-        # Initialize scraper
-        scraper = GoogleMapsUtils(headless=True)
-        scraper.setup_driver()
+        # One scraper (and Chrome driver) per worker thread
+        worker_state = threading.local()
+        scrapers = []
+        scrapers_lock = threading.Lock()
+        
+        def get_address(url):
+            if not hasattr(worker_state, 'scraper'):
+                worker_state.scraper = GoogleMapsUtils(headless=True)
+                worker_state.scraper.setup_driver()
+                with scrapers_lock:
+                    scrapers.append(worker_state.scraper)
+            return worker_state.scraper.get_address_from_url(url)
+        
+        # Reuse results of previous runs: URLs with a known address are not scraped again
+        mapping_file = self.output_dir / "url_address_mapping.json"
+        if mapping_file.exists():
+            with open(mapping_file, 'r', encoding='utf-8') as f:
+                self.url_address_map = json.load(f)
+        
+        enriched_file = self.output_dir / "branches_enriched.parquet"
+        previous = {}
+        if enriched_file.exists():
+            previous_df = pd.read_parquet(enriched_file, columns=['branch_url', 'enriched_address', 'phone'])
+            previous = previous_df.drop_duplicates('branch_url').set_index('branch_url').to_dict('index')
         
         # Process branches
-        enriched_data = []
         branches_to_process = branches_df.head(limit) if limit else branches_df
+        rows = list(branches_to_process.itertuples(index=False))
+        results = [None] * len(rows)
+        
+        to_scrape = []
+        for i, row in enumerate(rows):
+            url = row.branch_url
+            known_address = self.url_address_map.get(url)
+            cached = previous.get(url, {})
+            # Scraping failures of previous runs (no enriched address) are retried
+            if isinstance(known_address, str) and known_address and cached.get('enriched_address', known_address):
+                results[i] = {
+                    'address': cached.get('enriched_address', known_address),
+                    'phone': cached.get('phone')
+                }
+            else:
+                to_scrape.append(i)
+        logger.info(f"{len(rows) - len(to_scrape)} branches already enriched, scraping {len(to_scrape)}")
+        
+        # Plain HTTPS first; only the pages it could not read are opened in Chrome
+        fetched = GoogleMapsHTTPUtils().get_addresses(list(dict.fromkeys(rows[i].branch_url for i in to_scrape)))
+        browser_needed = []
+        for i in to_scrape:
+            result = fetched[rows[i].branch_url]
+            if result:
+                results[i] = result
+                self.url_address_map[rows[i].branch_url] = result['address']
+            else:
+                browser_needed.append(i)
+        logger.info(f"{len(to_scrape) - len(browser_needed)} branches fetched over HTTP, "
+                    f"{len(browser_needed)} left for the browser")
+        to_scrape = browser_needed
+        
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = {
+                    executor.submit(get_address, rows[i].branch_url): i
+                    for i in to_scrape
+                }
+                for done, future in enumerate(as_completed(futures), start=1):
+                    i = futures[future]
+                    results[i] = future.result()
+                    logger.info(f"Processed branch {done}/{len(to_scrape)}: {rows[i].branch_name}")
+                    
+                    # Update mapping, saving progress regularly so a crash does not lose it
+                    self.url_address_map[rows[i].branch_url] = results[i]['address'] or rows[i].address
+                    if done % ENRICH_SAVE_EVERY == 0:
+                        self._save_url_address_map()
+        finally:
+            for scraper in scrapers:
+                scraper.close()
         
-        for idx, row in branches_to_process.iterrows():
-            logger.info(f"Processing branch {idx + 1}/{len(branches_to_process)}: {row['branch_name']}")
-            
-            # Get address from URL
-            result = scraper.get_address_from_url(row['branch_url'])
-            
-            # Update mapping
-            self.url_address_map[row['branch_url']] = result['address'] or row['address']
-            
+        enriched_data = []
+        for row, result in zip(rows, results):
             # Store enriched data
             enriched_data.append({
-                'bank_name': row['bank_name'],
-                'branch_name': row['branch_name'],
-                'branch_url': row['branch_url'],
-                'original_address': row['address'],
+                'bank_name': row.bank_name,
+                'branch_name': row.branch_name,
+                'branch_url': row.branch_url,
+                'original_address': row.address,
                 'enriched_address': result['address'],
                 'phone': result.get('phone'),
-                'rating': row.get('rating'),
-                'review_count': row.get('review_count')
+                'rating': getattr(row, 'rating', None),
+                'review_count': getattr(row, 'review_count', None)
             })
-            
-            # Be respectful
-            time.sleep(2)
-            
-        scraper.close()
         
         # Save enriched branches
         enriched_df = pd.DataFrame(enriched_data)
-        output_file = self.output_dir / "branches_enriched.csv"
-        enriched_df.to_csv(output_file, index=False, encoding='utf-8')
-        logger.info(f"Saved enriched branches to {output_file}")
+        enriched_df.to_parquet(enriched_file, engine='pyarrow', compression='zstd', index=False)
+        logger.info(f"Saved enriched branches to {enriched_file}")
         
         # Save URL-address mapping
-        mapping_file = self.output_dir / "url_address_mapping.json"
-        with open(mapping_file, 'w', encoding='utf-8') as f:
-            json.dump(self.url_address_map, f, ensure_ascii=False, indent=2)
+        mapping_file = self._save_url_address_map()
         logger.info(f"Saved URL-address mapping to {mapping_file}")
         
         return self.url_address_map
         
+    def _save_url_address_map(self) -> Path:
+        """Write the URL-address mapping atomically (temp file + rename)"""
+        mapping_file = self.output_dir / "url_address_mapping.json"
+        tmp_file = mapping_file.with_name(mapping_file.name + ".tmp")
+        tmp_file.write_bytes(orjson.dumps(self.url_address_map, option=JSON_DUMP_OPTIONS))
+        os.replace(tmp_file, mapping_file)
+        return mapping_file
+        
     def clean_review_text(self, reviews_df: pd.DataFrame) -> pd.DataFrame:
         """
         Step 2: Remove reviews with weird symbols or empty text
@@ -130,33 +241,17 @@ class DataCleaningPipeline:
         logger.info("Cleaning review text...")
         initial_count = len(reviews_df)
         
-        # Define patterns for weird symbols
-        weird_patterns = [
-            r'^[\s\n]*$',  # Empty or only whitespace/newlines
-            r'^[\W_]+$',   # Only non-word characters
-            r'^\s*[\u0000-\u001F\u007F-\u009F]+\s*$',  # Control characters
-        ]
-        
-        # Function to check if text is valid
-        def is_valid_text(text):
-            if pd.isna(text) or text == '':
-                return False
-            
-            # Check for weird patterns
-            for pattern in weird_patterns:
-                if re.match(pattern, str(text)):
-                    return False
-                    
-            # Must have at least 3 alphabetic characters
-            if len(re.findall(r'[a-zA-Z]', str(text))) < 3:
-                return False
-                
-            return True
-        
-        # Filter reviews
-        reviews_df['is_valid_text'] = reviews_df['review_text'].apply(is_valid_text)
-        cleaned_df = reviews_df[reviews_df['is_valid_text']].drop('is_valid_text', axis=1)
-        
+        text = reviews_df['review_text'].fillna('').astype(str)
+
+        # Weird patterns and alphabetic character count, evaluated column-wise
+        is_weird = text.str.match(WEIRD_TEXT_PATTERN)
+        alpha_count = text.str.count(ALPHA_CHAR_PATTERN)
+
+        # Must not be weird and have at least 3 alphabetic characters
+        is_valid_text = ~is_weird & (alpha_count >= 3)
+        # take() builds the filtered frame as a new, writable frame in one copy
+        cleaned_df = reviews_df.take(np.flatnonzero(is_valid_text))
+
         removed_count = initial_count - len(cleaned_df)
         logger.info(f"Removed {removed_count} reviews with invalid text ({removed_count/initial_count*100:.2f}%)")
         
@@ -178,22 +273,15 @@ class DataCleaningPipeline:
                 logger.warning("No URL-address mapping found. Skipping address update.")
                 return reviews_df
                 
-        # Update addresses
-        def get_updated_address(row):
-            url = row['branch_url']
-            if url in self.url_address_map and self.url_address_map[url]:
-                return self.url_address_map[url]
-            return row['branch_address']
-            
-        reviews_df['branch_address_updated'] = reviews_df.apply(get_updated_address, axis=1)
+        # Update addresses where the mapping has a non-empty address for the URL
+        mapped = reviews_df['branch_url'].map(self.url_address_map)
+        has_mapping = mapped.notna() & (mapped != '')
         
         # Count updates
-        updates = (reviews_df['branch_address'] != reviews_df['branch_address_updated']).sum()
+        updates = (has_mapping & (mapped != reviews_df['branch_address'])).sum()
         logger.info(f"Updated {updates} addresses")
         
-        # Replace old address column
-        reviews_df['branch_address'] = reviews_df['branch_address_updated']
-        reviews_df = reviews_df.drop('branch_address_updated', axis=1)
+        reviews_df['branch_address'] = mapped.where(has_mapping, reviews_df['branch_address'])
         
         return reviews_df
 
@@ -209,117 +297,58 @@ class DataCleaningPipeline:
 
         logger.info("Normalizing review dates…")
 
-        def parse_relative_date(relative: str, scraped_at: str) -> str:
-            """Return YYYY-MM-DD."""
-            base = pd.to_datetime(scraped_at)
-
-            # empty or NaN → assume “today”
-            if pd.isna(relative) or relative == "":
-                return base.strftime("%Y-%m-%d")
-
-            text = str(relative).lower().strip()
-
-            # explicit words first
-            if text in {"today", "now"}:
-                return base.strftime("%Y-%m-%d")
-            if text == "yesterday":
-                return (base - timedelta(days=1)).strftime("%Y-%m-%d")
-
-            # capture “a month ago”, “3 years ago”, “an hour ago” …
-            m = re.match(r"(a|an|\d+)\s+([a-z]+)", text)
-            if not m:
-                # fallback: give up and return the scrape date
-                logger.warning(f"Unrecognised relative date «{relative}» – using scraped_at")
-                return base.strftime("%Y-%m-%d")
-
-            n_raw, unit = m.groups()
-            n = 1 if n_raw in {"a", "an"} else int(n_raw)
-
-            # pick the right offset object
-            if "year" in unit:
-                delta = relativedelta(years=n)
-            elif "month" in unit:
-                delta = relativedelta(months=n)
-            elif "week" in unit:
-                delta = relativedelta(weeks=n)
-            elif "day" in unit:
-                delta = timedelta(days=n)
-            elif "hour" in unit:
-                delta = timedelta(hours=n)
-            elif "minute" in unit:
-                delta = timedelta(minutes=n)
-            else:
-                logger.warning(f"Unhandled time unit in «{relative}» – using scraped_at")
-                return base.strftime("%Y-%m-%d")
+        # scraped_at repeats heavily within a scrape batch: parse each distinct value once
+        base = pd.to_datetime(reviews_df["scraped_at"], format="ISO8601", cache=True)
+        text = reviews_df["review_date"].fillna("").astype(str).str.lower().str.strip()
 
-            return (base - delta).strftime("%Y-%m-%d")
+        # capture “a month ago”, “3 years ago”, “an hour ago” …
+        parts = text.str.extract(RELATIVE_DATE_PATTERN)
+        n = pd.to_numeric(parts["n"].replace({"a": "1", "an": "1"})).fillna(0)
+        unit = parts["unit"]
 
-        # vectorised apply
-        reviews_df["review_date_normalized"] = reviews_df.apply(
-            lambda row: parse_relative_date(row["review_date"], row["scraped_at"]),
-            axis=1,
+        # calendar offsets (years/months) and fixed offsets (weeks … minutes)
+        months_back = n * unit.map(MONTHS_PER_UNIT).fillna(0)
+        minutes_back = n * unit.map(MINUTES_PER_UNIT).fillna(0)
+        minutes_back = pd.Series(
+            np.where(text == "yesterday", 24 * 60, minutes_back), index=reviews_df.index
         )
 
-        # convenience columns for grouping
-        reviews_df["review_date_normalized"] = pd.to_datetime(
-            reviews_df["review_date_normalized"]
-        )
-        reviews_df["review_year"] = reviews_df["review_date_normalized"].dt.year
-        reviews_df["review_month"] = reviews_df["review_date_normalized"].dt.month
+        # empty, “today”, “now” and anything unrecognised keep the scrape date
+        unrecognised = (text != "") & ~text.isin({"today", "now", "yesterday"}) & unit.isna()
+        for relative in reviews_df.loc[unrecognised, "review_date"].unique():
+            logger.warning(f"Unrecognised relative date «{relative}» – using scraped_at")
+
+        shifted = base - pd.to_timedelta(minutes_back, unit="m")
+        shifted = self._subtract_months(shifted, months_back)
+        reviews_df["review_date_normalized"] = shifted.dt.normalize()
+
+        # convenience columns for grouping, both taken from one month-resolution view
+        # of the dates (the .dt accessors are kept for the missing-date case)
+        dates = reviews_df["review_date_normalized"]
+        if dates.isna().any():
+            reviews_df["review_year"] = dates.dt.year
+            reviews_df["review_month"] = dates.dt.month
+        else:
+            months = dates.to_numpy().astype("datetime64[M]").astype(np.int64)
+            reviews_df["review_year"] = (months // 12 + 1970).astype(np.int32)
+            reviews_df["review_month"] = (months % 12 + 1).astype(np.int32)
 
         return reviews_df
 
-    # def normalize_review_dates(self, reviews_df: pd.DataFrame) -> pd.DataFrame:
-    #     """
-    #     Step 4: Normalize review dates to standard format
-    #     """
-    #     logger.info("Normalizing review dates...")
-        
-    #     def parse_relative_date(review_date: str, scraped_at: str) -> str:
-    #         """Convert relative dates to absolute dates"""
-    #         try:
-    #             # Parse scraped_at date
-    #             base_date = pd.to_datetime(scraped_at)
-                
-    #             if pd.isna(review_date) or review_date == '':
-    #                 return base_date.strftime('%Y-%m-%d')
-                    
-    #             review_date = str(review_date).lower()
-                
-    #             # Parse relative dates
-    #             if 'year' in review_date:
-    #                 years = int(re.findall(r'(\d+)', review_date)[0])
-    #                 return (base_date - timedelta(days=365 * years)).strftime('%Y-%m-%d')
-    #             elif 'month' in review_date:
-    #                 months = int(re.findall(r'(\d+)', review_date)[0])
-    #                 return (base_date - timedelta(days=30 * months)).strftime('%Y-%m-%d')
-    #             elif 'week' in review_date:
-    #                 weeks = int(re.findall(r'(\d+)', review_date)[0])
-    #                 return (base_date - timedelta(weeks=weeks)).strftime('%Y-%m-%d')
-    #             elif 'day' in review_date:
-    #                 days = int(re.findall(r'(\d+)', review_date)[0])
-    #                 return (base_date - timedelta(days=days)).strftime('%Y-%m-%d')
-    #             else:
-    #                 return base_date.strftime('%Y-%m-%d')
-                    
-    #         except Exception as e:
-    #             logger.warning(f"Error parsing date '{review_date}': {str(e)}")
-    #             return pd.to_datetime(scraped_at).strftime('%Y-%m-%d')
-                
-    #     # Apply normalization
-    #     reviews_df['review_date_normalized'] = reviews_df.apply(
-    #         lambda row: parse_relative_date(row['review_date'], row['scraped_at']), 
-    #         axis=1
-    #     )
-        
-    #     # Add review year and month for analysis
-    #     reviews_df['review_date_normalized'] = pd.to_datetime(reviews_df['review_date_normalized'])
-    #     reviews_df['review_year'] = reviews_df['review_date_normalized'].dt.year
-    #     reviews_df['review_month'] = reviews_df['review_date_normalized'].dt.month
-        
-    #     return reviews_df
-        
-    def run_full_pipeline(self, enrich_addresses: bool = True, limit_branches: int = None):
+    @staticmethod
+    def _subtract_months(dates: pd.Series, months: pd.Series) -> pd.Series:
+        """
+        Vectorised equivalent of ``date - relativedelta(months=n)``: the day of
+        month is clipped to the length of the target month (Mar 31 → Feb 28).
+        """
+        total = dates.dt.year * 12 + (dates.dt.month - 1) - months
+        year, month = total // 12, total % 12 + 1
+        month_start = pd.to_datetime(pd.DataFrame({"year": year, "month": month, "day": 1}))
+        day = np.minimum(dates.dt.day, month_start.dt.days_in_month)
+        return month_start + pd.to_timedelta(day - 1, unit="D") + (dates - dates.dt.normalize())
+
+    def run_full_pipeline(self, enrich_addresses: bool = True, limit_branches: int = None,
+                          max_workers: int = ENRICH_MAX_WORKERS):
         """
         Run the complete cleaning pipeline
         """
@@ -327,52 +356,118 @@ class DataCleaningPipeline:
         
         # Step 1: Enrich branch addresses (optional)
         if enrich_addresses:
-            self.enrich_branch_addresses(limit=limit_branches)
+            self.enrich_branch_addresses(limit=limit_branches, max_workers=max_workers)
         
-        # Load reviews
-        reviews_df = pd.read_csv(self.input_dir / self.reviews_file)
-        logger.info(f"Loaded {len(reviews_df)} reviews")
+        # Load reviews in chunks to keep memory bounded regardless of file size
+        reader = self._read_review_chunks()
+        output_file = self.output_dir / "reviews_cleaned.parquet"
+        summary = SummaryStats()
+        writer = None
         
-        # Step 2: Clean review text
+        try:
+            for chunk_idx, reviews_df in enumerate(reader, start=1):
+                logger.info(f"Loaded chunk {chunk_idx}: {len(reviews_df)} reviews")
+                
+                # Steps 2-4: clean text, update addresses, normalize dates
+                reviews_df = self._clean_and_enrich(reviews_df)
+                
+                # Append cleaned reviews
+                writer = self._write_parquet_chunk(writer, reviews_df, output_file)
+                summary.update(reviews_df)
+        finally:
+            if writer:
+                writer.close()
+        
+        logger.info(f"Saved {summary.total_reviews} cleaned reviews to {output_file}")
+        
+        # Generate summary statistics
+        return self.generate_summary_stats(summary)
+    
+    def _read_review_chunks(self, chunksize: int = CLEANING_CHUNK_SIZE):
+        """Iterate over the raw reviews CSV in chunks with the same dtypes in every chunk"""
+        return pd.read_csv(
+            self.reviews_file,
+            chunksize=chunksize,
+            dtype=REVIEW_DTYPES
+        )
+    
+    def _clean_and_enrich(self, reviews_df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Steps 2-4 over a single frame: invalid reviews are filtered out once, then the
+        address and date columns are written in place on that filtered frame
+        """
+        # Step 2: Clean review text (the only step that copies the rows)
         reviews_df = self.clean_review_text(reviews_df)
         
         # Step 3: Update branch addresses
         reviews_df = self.update_branch_addresses(reviews_df)
         
         # Step 4: Normalize dates
-        reviews_df = self.normalize_review_dates(reviews_df)
-        
-        # Save cleaned reviews
-        output_file = self.output_dir / "reviews_cleaned.csv"
-        reviews_df.to_csv(output_file, index=False, encoding='utf-8')
-        logger.info(f"Saved {len(reviews_df)} cleaned reviews to {output_file}")
-        
-        # Generate summary statistics
-        self.generate_summary_stats(reviews_df)
-        
-        return reviews_df
-        
-    def generate_summary_stats(self, reviews_df: pd.DataFrame):
+        return self.normalize_review_dates(reviews_df)
+    
+    @staticmethod
+    def _write_parquet_chunk(writer, reviews_df: pd.DataFrame, output_file: Path):
+        """Append a chunk to the output Parquet file, opening the writer on the first chunk"""
+        table = pa.Table.from_pandas(reviews_df, preserve_index=False)
+        if writer is None:
+            # Columns entirely missing from the first chunk would otherwise be typed null
+            schema = pa.schema([
+                field.with_type(CATEGORICAL_ARROW_TYPE) if field.name in CATEGORICAL_COLUMNS
+                else field.with_type(pa.string()) if pa.types.is_null(field.type)
+                else field
+                for field in table.schema
+            ], metadata=table.schema.metadata)
+            writer = pq.ParquetWriter(output_file, schema, compression='zstd')
+        writer.write_table(table.cast(writer.schema))
+        return writer
+        
+    def generate_summary_stats(self, summary: 'SummaryStats') -> dict:
         """Generate summary statistics of the cleaned data"""
-        stats = {
-            'total_reviews': len(reviews_df),
-            'unique_banks': reviews_df['bank_name'].nunique(),
-            'unique_branches': reviews_df['branch_name'].nunique(),
-            'avg_rating': reviews_df['rating'].mean(),
-            'reviews_by_year': reviews_df['review_year'].value_counts().to_dict(),
-            'reviews_by_rating': reviews_df['rating'].value_counts().to_dict()
-        }
+        stats = summary.to_dict()
         
         stats_file = self.output_dir / "cleaning_summary.json"
-        with open(stats_file, 'w') as f:
-            json.dump(stats, f, indent=2)
-            
+        stats_file.write_bytes(orjson.dumps(stats, option=JSON_DUMP_OPTIONS))
+        
         logger.info(f"Summary statistics saved to {stats_file}")
+        return stats
+
+
+class SummaryStats:
+    """Summary statistics of the cleaned reviews, accumulated chunk by chunk"""
+    
+    def __init__(self):
+        self.total_reviews = 0
+        self.banks = set()
+        self.branches = set()
+        self.rating_sum = 0.0
+        self.rating_count = 0
+        self.reviews_by_year = Counter()
+        self.reviews_by_rating = Counter()
+        
+    def update(self, reviews_df: pd.DataFrame):
+        """Add a chunk of cleaned reviews"""
+        self.total_reviews += len(reviews_df)
+        self.banks.update(reviews_df['bank_name'].dropna().unique())
+        self.branches.update(reviews_df['branch_name'].dropna().unique())
+        self.rating_sum += reviews_df['rating'].sum()
+        self.rating_count += int(reviews_df['rating'].count())
+        self.reviews_by_year.update(reviews_df['review_year'].value_counts().to_dict())
+        self.reviews_by_rating.update(reviews_df['rating'].value_counts().to_dict())
+        
+    def to_dict(self) -> dict:
+        return {
+            'total_reviews': self.total_reviews,
+            'unique_banks': len(self.banks),
+            'unique_branches': len(self.branches),
+            'avg_rating': float(self.rating_sum / self.rating_count) if self.rating_count else None,
+            'reviews_by_year': dict(self.reviews_by_year.most_common()),
+            'reviews_by_rating': dict(self.reviews_by_rating.most_common())
+        }
 
 
-def main():
+def main(branches_file: str = None, reviews_file: str = None):
     """Main execution function"""
-    pipeline = DataCleaningPipeline()
+    pipeline = DataCleaningPipeline(branches_file=branches_file, reviews_file=reviews_file)
     
     # Run with options
     # Option 1: Full pipeline with address enrichment (slow but complete)
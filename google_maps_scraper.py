@@ -4,12 +4,20 @@ Date: 2025-01-06
 Description: Enhanced scraper that first collects all branch URLs, then scrapes reviews
 """
 
-import json
+import csv
+import os
+import hashlib
+import queue
+import sqlite3
+import threading
 import time
 import logging
-from datetime import datetime
+import asyncio
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from typing import List, Dict, Optional, Set
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, field
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
@@ -17,10 +25,14 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
-import pandas as pd
+import httpx
+import orjson
+import xxhash
 from pathlib import Path
 import re
 
+from scraper_utils import FEATURE_ID_RE, http_client
+
 
 # Configure logging
 def setup_logging(level=logging.INFO):
@@ -37,8 +49,13 @@ def setup_logging(level=logging.INFO):
 
 logger = setup_logging()
 
+# Patterns matched once per scraped review or address candidate
+_STAR_RE = re.compile(r'(\d+)\s*star')
+_ADDR_RE = re.compile(r'bd|avenue|rue|street|·')  # Matched against lowercased text
+_DATE_RE = re.compile(r'ago|year|month|day|week', re.I)
+
 
-@dataclass
+@dataclass(slots=True)
 class BankBranch:
     """Data class for bank branch information"""
     bank_name: str
@@ -49,7 +66,7 @@ class BankBranch:
     review_count: Optional[int] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class Review:
     """Data class for storing review information"""
     bank_name: str
@@ -62,19 +79,271 @@ class Review:
     review_date: str
     helpful_count: int = 0
     response_from_owner: Optional[str] = None
-    scraped_at: str = datetime.now().isoformat()
+    scraped_at: str = field(default_factory=lambda: datetime.now().isoformat())
+
+
+# CSV column order of the scraped outputs
+BRANCH_FIELDS = list(BankBranch.__dataclass_fields__)
+REVIEW_FIELDS = list(Review.__dataclass_fields__)
+
+# Resources skipped by the browser; stylesheets stay allowed because the
+# scrollable results and reviews panels depend on them
+BLOCKED_URL_PATTERNS = [
+    "*.jpg", "*.jpeg", "*.png", "*.webp", "*.gif", "*.woff*", "*.mp4",
+    "*googletagmanager*", "*doubleclick*", "*maps/vt*", "*streetview*"
+]
+
+# Cities searched in parallel, each in its own Chrome driver (the Airflow scraping
+# pool reserves this many slots for the scrape task)
+SEARCH_MAX_WORKERS = 4
+
+
+class GoogleMapsHTTPScraper:
+    """
+    Fetch branch reviews over plain HTTPS from the Maps review endpoint, without a browser.
+    
+    The endpoint is addressed with the place feature ID embedded in the branch URL
+    (``!1s0x...:0x...``) and answers with ``)]}'``-prefixed JSON. Branches it cannot
+    serve are reported as ``None`` so the caller can fall back to Selenium.
+    """
+    
+    REVIEWS_URL = "https://www.google.com/maps/preview/review/listentitiesreviews"
+    
+    def __init__(self, max_concurrency: int = 8, page_size: int = 10, max_reviews: int = 500,
+                 page_delay: float = 0.5):
+        self.max_concurrency = max_concurrency  # Branches fetched at the same time
+        self.page_size = page_size
+        self.max_reviews = max_reviews
+        self.page_delay = page_delay  # Seconds between two review pages of a branch
+        
+    def scrape(self, branches: List[BankBranch]) -> Dict[str, Optional[List[Review]]]:
+        """Fetch the reviews of all branches concurrently, keyed by branch URL"""
+        return asyncio.run(self._scrape_all(branches))
+        
+    async def _scrape_all(self, branches: List[BankBranch]) -> Dict[str, Optional[List[Review]]]:
+        # At most max_concurrency branches in flight, so the endpoint is not flooded
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        
+        async def fetch_limited(branch: BankBranch) -> Optional[List[Review]]:
+            async with semaphore:
+                return await self.fetch_reviews(client, branch)
+        
+        async with http_client(self.max_concurrency) as client:
+            results = await asyncio.gather(*(fetch_limited(b) for b in branches))
+        return {branch.branch_url: reviews for branch, reviews in zip(branches, results)}
+        
+    async def fetch_reviews(self, client: httpx.AsyncClient, branch: BankBranch) -> Optional[List[Review]]:
+        """Return the branch reviews, or None if the endpoint could not serve them"""
+        match = FEATURE_ID_RE.search(branch.branch_url)
+        if not match:
+            return None
+        feature_a, feature_b = (int(part, 16) for part in match.groups())
+        
+        reviews = []
+        try:
+            for offset in range(0, self.max_reviews, self.page_size):
+                pb = (
+                    f"!1m2!1y{feature_a}!2y{feature_b}!2m2!1i{offset}!2i{self.page_size}"
+                    "!3e1!4m5!3b1!4b1!5b1!6b1!7b1!5m2!1s!7e81"
+                )
+                response = await client.get(self.REVIEWS_URL, params={"authuser": 0, "hl": "en", "pb": pb})
+                response.raise_for_status()
+                
+                # Drop the )]}' anti-JSON-hijacking prefix line
+                payload = orjson.loads(response.content.split(b"\n", 1)[1])
+                page = payload[2] or []
+                reviews.extend(self._parse_review(branch, raw) for raw in page)
+                if len(page) < self.page_size:
+                    break
+                await asyncio.sleep(self.page_delay)
+        except (httpx.HTTPError, orjson.JSONDecodeError, IndexError, TypeError, ValueError) as e:
+            logger.warning(f"HTTP review fetch failed for {branch.branch_name}: {str(e)}")
+            return None
+            
+        logger.info(f"Fetched {len(reviews)} reviews over HTTP for {branch.branch_name}")
+        return reviews
+        
+    @staticmethod
+    def _parse_review(branch: BankBranch, raw: list) -> Review:
+        """Map one entry of the endpoint's nested review list to a Review"""
+        return Review(
+            bank_name=branch.bank_name,
+            branch_name=branch.branch_name,
+            branch_address=branch.address,
+            branch_url=branch.branch_url,
+            reviewer_name=raw[0][1] or "Anonymous",
+            rating=float(raw[4] or 0),
+            review_text=raw[3] or "",
+            review_date=raw[1] or ""
+        )
 
 
 class GoogleMapsScraper:
     """Enhanced scraper for Google Maps reviews"""
     
-    def __init__(self, headless: bool = False, wait_time: int = 15, max_branches_per_bank: int = None):
+    CACHE_MAX_AGE_DAYS = 7
+    WRITE_BATCH_SIZE = 256  # Rows written per background writer batch
+    FSYNC_INTERVAL = 5  # Seconds between fsyncs of the streaming outputs
+    
+    # Reads the name, URL, address lines, rating and review count of every
+    # search result card, replacing the per-result XPath parent lookups
+    _BRANCH_LINKS_JS = """
+        const text = (root, selector) => {
+            const node = root.querySelector(selector);
+            return node ? node.innerText : null;
+        };
+        return [...document.querySelectorAll('a.hfpxzc')].map(a => {
+            const card = a.closest('div.Nv2PK') || a.parentElement.parentElement;
+            return {
+                url: a.href,
+                name: text(card, 'div.qBF1Pd.fontHeadlineSmall'),
+                address_texts: [...card.querySelectorAll('div.W4Efsd')].map(d => d.innerText),
+                rating: text(card, 'span.MW4etd'),
+                review_count: text(card, 'span.UY7F9')
+            };
+        });
+    """
+    
+    # Review containers and, per field, the selectors tried in order inside each one
+    REVIEW_SELECTORS = [
+        "[data-review-id]",
+        "[jscontroller='fIQYlf']",  # Common review controller
+        "div[aria-label*='stars']",  # Review containers with ratings
+        ".jftiEf"  # Review section class
+    ]
+    NAME_SELECTORS = [".d4r55", "button.WEBjve", "div.WEBjve", "[data-review-id] button[aria-label]", ".kvMYJc", "a[href*='/contrib/']"]
+    TEXT_SELECTORS = [".wiI7pd", ".MyEned", "span.wiI7pd", "[data-review-id] > div > div > div > span", ".Jtu6Td > span"]
+    DATE_SELECTORS = [".rsqaWe", "span.rsqaWe", ".DU9Pgb > span", "[class*='fontBodyMedium'] span"]
+    
+    # Returns the first element, trying the selectors in order, whose scrollHeight
+    # exceeds the given minimum, instead of one scrollHeight round trip per candidate
+    _FIND_SCROLLABLE_JS = """
+        const [selectors, minHeight] = arguments;
+        for (const selector of selectors) {
+            for (const el of document.querySelectorAll(selector)) {
+                if (el.scrollHeight > minHeight) return el;
+            }
+        }
+        return null;
+    """
+    
+    # Scrolls a container to the bottom again on every DOM mutation and resolves with the
+    # number of loaded items once nothing has changed for 1.5 s, maxItems are loaded
+    # (when given) or 55 s have passed
+    _SCROLL_UNTIL_IDLE_JS = """
+        const [el, itemSelector, maxItems, done] = arguments;
+        const start = Date.now();
+        let lastChange = start;
+        const observer = new MutationObserver(() => {
+            lastChange = Date.now();
+            el.scrollTop = el.scrollHeight;
+        });
+        observer.observe(el, {childList: true, subtree: true});
+        el.scrollTop = el.scrollHeight;
+        const timer = setInterval(() => {
+            const now = Date.now();
+            const enough = maxItems && document.querySelectorAll(itemSelector).length >= maxItems;
+            if (enough || now - lastChange > 1500 || now - start > 55000) {
+                clearInterval(timer);
+                observer.disconnect();
+                done(document.querySelectorAll(itemSelector).length);
+            }
+        }, 200);
+    """
+    
+    # Walks the review containers in-page and returns the candidate text of each
+    # field selector, so one call replaces all find_element trips
+    _EXTRACT_JS = """
+        const [reviewSelectors, nameSelectors, textSelectors, dateSelectors] = arguments;
+        const texts = (root, selectors) => selectors.map(s => {
+            const node = root.querySelector(s);
+            return node ? node.innerText.trim() : null;
+        });
+        // One selector group returns each matching element once, in document order
+        return [...document.querySelectorAll(reviewSelectors.join(', '))].map(el => {
+            const star = el.querySelector("[role='img'][aria-label*='star']");
+            return {
+                names: texts(el, nameSelectors),
+                rating_label: star ? star.getAttribute('aria-label') : null,
+                filled_stars: el.querySelectorAll('.hCCjke.vzX5Ic').length,
+                texts: texts(el, textSelectors),
+                dates: texts(el, dateSelectors)
+            };
+        });
+    """
+    
+    def __init__(self, headless: bool = False, wait_time: int = 15, max_branches_per_bank: int = None,
+                 use_http: bool = True, max_tabs: int = 8, use_cache: bool = True,
+                 max_search_workers: int = SEARCH_MAX_WORKERS):
         self.headless = headless
         self.wait_time = wait_time
         self.max_branches_per_bank = max_branches_per_bank  # Limit branches for testing
+        self.use_http = use_http  # Fetch reviews over HTTP, Selenium only as a fallback
+        self.max_tabs = max_tabs  # Branch pages loaded concurrently in the shared browser
+        self.use_cache = use_cache  # Reuse reviews scraped in the last CACHE_MAX_AGE_DAYS
+        self.max_search_workers = max_search_workers  # Cities searched in parallel, one driver each
         self.driver = None
-        self.branches_collected = []
-        self.reviews_collected = []
+        self._search_workers = queue.Queue()  # Idle scrapers available for city searches
+        self._helper_scrapers = []  # Extra scrapers started for parallel searches
+        self._cache_db = None
+        self.branch_counts = Counter()
+        self.review_counts = Counter()
+        self._outputs = {}  # Streaming output files: key -> (path, handle, csv writer)
+        self._write_queue = queue.Queue(maxsize=1024)  # Rows waiting for the background writer
+        self._writer_thread = None
+        self._write_error = None  # First error of the background writer, fails save_data
+        
+    def _cache(self) -> sqlite3.Connection:
+        """Open the on-disk review cache keyed by branch URL on first use"""
+        if self._cache_db is None:
+            cache_file = Path(__file__).resolve().parent / "data" / "cache.sqlite"
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            self._cache_db = sqlite3.connect(cache_file)
+            self._cache_db.execute("""
+                CREATE TABLE IF NOT EXISTS reviews (
+                    branch_url TEXT PRIMARY KEY,
+                    content_hash TEXT,
+                    last_seen TEXT,
+                    reviews_json BLOB
+                )
+            """)
+        return self._cache_db
+        
+    def _load_cached_reviews(self, branches: List[BankBranch]) -> Dict[str, List[Review]]:
+        """Return the reviews of branches scraped recently enough to skip, keyed by URL"""
+        cutoff = (datetime.now() - timedelta(days=self.CACHE_MAX_AGE_DAYS)).isoformat()
+        cached = {}
+        for branch in branches:
+            row = self._cache().execute(
+                "SELECT reviews_json FROM reviews WHERE branch_url = ? AND last_seen >= ?",
+                (branch.branch_url, cutoff)
+            ).fetchone()
+            if row:
+                cached[branch.branch_url] = [Review(**r) for r in orjson.loads(row[0])]
+        return cached
+        
+    def _cache_reviews(self, branch: BankBranch, reviews: List[Review]) -> None:
+        """Store freshly scraped reviews; empty results are not cached so they are retried"""
+        if not reviews:
+            return
+        payload = orjson.dumps([asdict(r) for r in reviews])
+        content_hash = hashlib.blake2b(payload, digest_size=16).hexdigest()
+        with self._cache():
+            self._cache().execute(
+                """
+                INSERT INTO reviews (branch_url, content_hash, last_seen, reviews_json)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (branch_url) DO UPDATE SET
+                    content_hash = excluded.content_hash,
+                    last_seen = excluded.last_seen,
+                    reviews_json = excluded.reviews_json
+                """,
+                (branch.branch_url, content_hash, datetime.now().isoformat(), payload)
+            )
+            
+    def _wait(self) -> WebDriverWait:
+        """Explicit wait that polls every 100 ms instead of sleeping a fixed time"""
+        return WebDriverWait(self.driver, self.wait_time, poll_frequency=0.1)
         
     def setup_driver(self):
         """Initialize Chrome driver with optimal settings"""
@@ -86,12 +355,28 @@ class GoogleMapsScraper:
         chrome_options.add_argument("--disable-blink-features=AutomationControlled")
         chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
         chrome_options.add_experimental_option('useAutomationExtension', False)
-        chrome_options.add_argument("--window-size=1920,1080")
+        # Small viewport: only the DOM text is read, lazy content is driven by scrollTop
+        chrome_options.add_argument("--window-size=800,600")
+        chrome_options.add_argument("--hide-scrollbars")
+        chrome_options.add_argument("--mute-audio")
+        chrome_options.add_argument("--disable-gpu")
+        chrome_options.add_argument("--disable-extensions")
+        # Reviews are read from the DOM text, so photos and map tiles are never needed
+        chrome_options.add_argument("--blink-settings=imagesEnabled=false")
+        chrome_options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
         
         self.driver = webdriver.Chrome(options=chrome_options)
         self.driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+        self.driver.set_script_timeout(60)  # Covers the in-page scroll-until-idle script
+        self._block_resources()
+        self._search_workers.put(self)
         logger.info("Chrome driver initialized successfully")
         
+    def _block_resources(self) -> None:
+        """Block BLOCKED_URL_PATTERNS in the current tab (CDP commands only reach one tab)"""
+        self.driver.execute_cdp_cmd("Network.enable", {})
+        self.driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URL_PATTERNS})
+        
     def search_bank(self, bank_name: str, city: str = "") -> None:
         """Search for a bank and wait for results"""
         query = f"{bank_name} {city} Morocco" if city else f"{bank_name} Morocco"
@@ -99,14 +384,11 @@ class GoogleMapsScraper:
         
         logger.info(f"Searching for: {query}")
         self.driver.get(search_url)
-        time.sleep(5)  # Wait for initial load
         
-        # Wait for results container
+        # Wait for results container and the first result links
         try:
-            WebDriverWait(self.driver, self.wait_time).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, "[role='main']"))
-            )
-            time.sleep(2)
+            self._wait().until(EC.presence_of_element_located((By.CSS_SELECTOR, "[role='main']")))
+            self._wait().until(EC.presence_of_element_located((By.CSS_SELECTOR, "a.hfpxzc")))
         except TimeoutException:
             logger.error(f"Timeout waiting for search results for: {query}")
             
@@ -114,20 +396,10 @@ class GoogleMapsScraper:
         """Scroll through search results to load all branches"""
         try:
             # Find the scrollable container - it's usually a div with role="main" or similar
-            scrollable_divs = self.driver.find_elements(By.CSS_SELECTOR, "[role='main'] [tabindex='-1'], [role='main'] > div > div")
+            scrollable_div = self.driver.execute_script(
+                self._FIND_SCROLLABLE_JS, ["[role='main'] [tabindex='-1'], [role='main'] > div > div"], 0
+            )
             
-            if not scrollable_divs:
-                logger.warning("No scrollable container found")
-                return
-                
-            scrollable_div = None
-            for div in scrollable_divs:
-                # Check if this div is scrollable
-                height = self.driver.execute_script("return arguments[0].scrollHeight", div)
-                if height > 0:
-                    scrollable_div = div
-                    break
-                    
             if not scrollable_div:
                 logger.warning("No valid scrollable container found")
                 return
@@ -137,36 +409,12 @@ class GoogleMapsScraper:
             # Hover over the container to ensure it's active
             actions = ActionChains(self.driver)
             actions.move_to_element(scrollable_div).perform()
-            time.sleep(1)
-            
-            last_count = 0
-            no_change_count = 0
-            max_scrolls = 20
             
-            for i in range(max_scrolls):
-                # Count current results
-                results = self.driver.find_elements(By.CSS_SELECTOR, "a.hfpxzc")
-                current_count = len(results)
-                
-                logger.info(f"Scroll {i+1}: Found {current_count} results")
-                
-                # Scroll down
-                self.driver.execute_script(
-                    "arguments[0].scrollTop = arguments[0].scrollHeight", 
-                    scrollable_div
-                )
-                time.sleep(2)
-                
-                # Check if we've reached the end
-                if current_count == last_count:
-                    no_change_count += 1
-                    if no_change_count >= 3:
-                        logger.info("No new results after 3 scrolls, stopping")
-                        break
-                else:
-                    no_change_count = 0
-                    
-                last_count = current_count
+            # Keep scrolling in-page until the list stops growing or holds enough branches
+            count = self.driver.execute_async_script(
+                self._SCROLL_UNTIL_IDLE_JS, scrollable_div, "a.hfpxzc", self.max_branches_per_bank
+            )
+            logger.info(f"Finished scrolling: Found {count} results")
                 
         except Exception as e:
             logger.error(f"Error while scrolling search results: {str(e)}")
@@ -176,53 +424,34 @@ class GoogleMapsScraper:
         branches = []
         
         try:
-            # Find all result links
-            result_elements = self.driver.find_elements(By.CSS_SELECTOR, "a.hfpxzc")
-            logger.info(f"Found {len(result_elements)} potential branches")
+            # Read every result card in one round trip
+            raw_results = self.driver.execute_script(self._BRANCH_LINKS_JS)
+            logger.info(f"Found {len(raw_results)} potential branches")
             
-            for element in result_elements:
+            for raw in raw_results:
                 try:
-                    # Get the parent container for this result
-                    parent = element.find_element(By.XPATH, "./parent::div/parent::div")
-                    
-                    # Extract branch name
-                    try:
-                        branch_name_elem = parent.find_element(By.CSS_SELECTOR, "div.qBF1Pd.fontHeadlineSmall")
-                        branch_name = branch_name_elem.text
-                    except:
-                        branch_name = bank_name
-                    
-                    # Extract URL
-                    branch_url = element.get_attribute("href")
+                    branch_name = raw['name'] if raw['name'] is not None else bank_name
+                    branch_url = raw['url']
                     
                     # Extract address
-                    try:
-                        address_divs = parent.find_elements(By.CSS_SELECTOR, "div.W4Efsd")
-                        address = ""
-                        for div in address_divs:
-                            text = div.text
-                            if any(marker in text.lower() for marker in ['bd', 'avenue', 'rue', 'street', '·']):
-                                # Clean up address
-                                address_parts = text.split('·')
-                                if len(address_parts) > 1:
-                                    address = address_parts[1].strip()
-                                else:
-                                    address = text
-                                break
-                    except:
-                        address = "Address not found"
+                    address = ""
+                    for text in raw['address_texts']:
+                        if _ADDR_RE.search(text.lower()):
+                            # Clean up address
+                            address_parts = text.split('·')
+                            if len(address_parts) > 1:
+                                address = address_parts[1].strip()
+                            else:
+                                address = text
+                            break
                     
                     # Extract rating and review count
                     rating = None
                     review_count = None
                     try:
-                        rating_elem = parent.find_element(By.CSS_SELECTOR, "span.MW4etd")
-                        rating = float(rating_elem.text)
-                        
-                        review_elem = parent.find_element(By.CSS_SELECTOR, "span.UY7F9")
-                        review_text = review_elem.text.strip("()")
-                        review_count = int(review_text)
-                    except:
+                        rating = float(raw['rating'])
+                        review_count = int(raw['review_count'].strip("()"))
+                    except (TypeError, ValueError, AttributeError):
                         pass
                     
                     branch = BankBranch(
@@ -256,15 +485,88 @@ class GoogleMapsScraper:
             logger.error(f"Error extracting branch links: {str(e)}")
             return []
             
+    def _search_city(self, bank_name: str, city: str) -> List[BankBranch]:
+        """Search one city on an idle scraper, starting another browser if all are busy"""
+        try:
+            worker = self._search_workers.get_nowait()
+        except queue.Empty:
+            worker = GoogleMapsScraper(headless=self.headless, wait_time=self.wait_time,
+                                       max_branches_per_bank=self.max_branches_per_bank,
+                                       use_http=False, use_cache=False)
+            worker.setup_driver()
+            self._helper_scrapers.append(worker)
+            
+        try:
+            logger.info(f"\n--- Searching {bank_name} in {city} ---")
+            worker.search_bank(bank_name, city)
+            worker.scroll_search_results()
+            branches = worker.extract_branch_links(bank_name)
+            logger.info(f"Found {len(branches)} branches in {city}")
+            
+            # Respect rate limits on this browser before its next search
+            time.sleep(3)
+            return branches
+        finally:
+            self._search_workers.put(worker)
+            
     def visit_branch_and_get_reviews(self, branch: BankBranch) -> List[Review]:
         """Visit a specific branch page and extract reviews"""
-        reviews = []
-        
         try:
             logger.info(f"Visiting branch: {branch.branch_name}")
             self.driver.get(branch.branch_url)
-            time.sleep(3)
+            self._wait().until(EC.presence_of_element_located((By.CSS_SELECTOR, "[role='main']")))
+        except Exception as e:
+            logger.error(f"Error visiting branch {branch.branch_name}: {str(e)}")
+            return []
+            
+        return self.get_reviews_from_current_page(branch)
+        
+    def visit_branches_in_tabs(self, branches: List[BankBranch]) -> Dict[str, List[Review]]:
+        """
+        Load branch pages concurrently in tabs of the shared browser and extract their reviews
+        
+        Each batch of up to max_tabs pages is opened at once so their loads overlap;
+        the tabs are then processed one by one and closed.
+        """
+        results = {}
+        main_handle = self.driver.current_window_handle
+        
+        for start in range(0, len(branches), self.max_tabs):
+            batch = branches[start:start + self.max_tabs]
+            handles = []
+            
+            # Start every load without waiting for it to finish
+            for branch in batch:
+                self.driver.switch_to.new_window('tab')
+                self._block_resources()
+                self.driver.execute_script("window.location.href = arguments[0]", branch.branch_url)
+                handles.append(self.driver.current_window_handle)
+                
+            for branch, handle in zip(batch, handles):
+                logger.info(f"Processing tab for branch: {branch.branch_name}")
+                try:
+                    self.driver.switch_to.window(handle)
+                    self._wait().until(EC.presence_of_element_located((By.CSS_SELECTOR, "[role='main']")))
+                    results[branch.branch_url] = self.get_reviews_from_current_page(branch)
+                except Exception as e:
+                    logger.error(f"Error visiting branch {branch.branch_name}: {str(e)}")
+                    results[branch.branch_url] = []
+                finally:
+                    self.driver.close()
+                    
+            self.driver.switch_to.window(main_handle)
             
+            # Respect rate limits between batches
+            if start + self.max_tabs < len(branches):
+                time.sleep(5)
+                
+        return results
+        
+    def get_reviews_from_current_page(self, branch: BankBranch) -> List[Review]:
+        """Open the reviews tab of the loaded branch page and extract reviews"""
+        reviews = []
+        
+        try:
             # Click on reviews tab
             try:
                 # Try multiple selectors for the reviews button
@@ -285,7 +587,7 @@ class GoogleMapsScraper:
                         
                 if reviews_button:
                     reviews_button.click()
-                    time.sleep(3)
+                    self._wait().until(EC.presence_of_element_located((By.CSS_SELECTOR, "[data-review-id], .jftiEf")))
                     logger.info("Clicked on reviews tab")
                 else:
                     logger.warning("Could not find reviews tab")
@@ -309,24 +611,14 @@ class GoogleMapsScraper:
     def scroll_reviews_panel(self):
         """Scroll through the reviews panel to load more reviews"""
         try:
-            # Find the reviews container
-            scrollable_div = None
+            # Find the reviews container: taller than 500 px is likely the reviews panel
             selectors = [
                 "[role='main'] [tabindex='-1']",
                 "[data-review-id]",
                 ".m6QErb.DxyBCb.kA9KIf.dS8AEf"
             ]
+            scrollable_div = self.driver.execute_script(self._FIND_SCROLLABLE_JS, selectors, 500)
             
-            for selector in selectors:
-                elements = self.driver.find_elements(By.CSS_SELECTOR, selector)
-                for elem in elements:
-                    height = self.driver.execute_script("return arguments[0].scrollHeight", elem)
-                    if height > 500:  # Likely the reviews container
-                        scrollable_div = elem
-                        break
-                if scrollable_div:
-                    break
-                    
             if not scrollable_div:
                 logger.warning("Could not find reviews scrollable container")
                 return
@@ -334,28 +626,10 @@ class GoogleMapsScraper:
             # Hover over container
             actions = ActionChains(self.driver)
             actions.move_to_element(scrollable_div).perform()
-            time.sleep(1)
-            
-            last_height = 0
-            for i in range(10):
-                # Scroll down
-                self.driver.execute_script(
-                    "arguments[0].scrollTop = arguments[0].scrollHeight", 
-                    scrollable_div
-                )
-                time.sleep(2)
-                
-                new_height = self.driver.execute_script(
-                    "return arguments[0].scrollHeight", 
-                    scrollable_div
-                )
-                
-                if new_height == last_height:
-                    logger.info("Reached end of reviews")
-                    break
-                    
-                last_height = new_height
-                logger.info(f"Review scroll {i+1} completed")
+            
+            # Keep scrolling in-page until no new reviews are added
+            count = self.driver.execute_async_script(self._SCROLL_UNTIL_IDLE_JS, scrollable_div, "[data-review-id]", None)
+            logger.info(f"Reached end of reviews: {count} loaded")
                 
         except Exception as e:
             logger.error(f"Error scrolling reviews: {str(e)}")
@@ -363,138 +637,68 @@ class GoogleMapsScraper:
     def extract_reviews_from_page(self, branch: BankBranch) -> List[Review]:
         """Extract all reviews from the current page"""
         reviews = []
-        seen_reviews = set()  # Track unique reviews to avoid duplicates
+        seen_reviews: Set[int] = set()  # 64-bit digests of unique reviews to avoid duplicates
         
         try:
-            # Wait a bit for reviews to load
-            time.sleep(2)
-            
-            # Find review containers - try multiple selectors
-            review_selectors = [
-                "[data-review-id]",
-                "[jscontroller='fIQYlf']",  # Common review controller
-                "div[aria-label*='stars']",  # Review containers with ratings
-                ".jftiEf"  # Review section class
-            ]
+            # Read every candidate field of every review in one round trip
+            raw_reviews = self.driver.execute_script(
+                self._EXTRACT_JS,
+                self.REVIEW_SELECTORS, self.NAME_SELECTORS, self.TEXT_SELECTORS, self.DATE_SELECTORS
+            )
             
-            all_review_elements = []
-            for selector in review_selectors:
-                elements = self.driver.find_elements(By.CSS_SELECTOR, selector)
-                if elements:
-                    logger.info(f"Found {len(elements)} potential reviews with selector: {selector}")
-                    all_review_elements.extend(elements)
-                    
-            if not all_review_elements:
+            if not raw_reviews:
                 logger.warning("No review elements found with any selector")
                 return reviews
+                
+            logger.info(f"Found {len(raw_reviews)} unique review elements")
             
-            # Remove duplicate elements by checking their location
-            unique_elements = []
-            seen_locations = set()
-            
-            for element in all_review_elements:
-                try:
-                    location = element.location
-                    loc_key = f"{location['x']},{location['y']}"
-                    if loc_key not in seen_locations:
-                        seen_locations.add(loc_key)
-                        unique_elements.append(element)
-                except:
-                    continue
-                    
-            logger.info(f"Found {len(unique_elements)} unique review elements after deduplication")
-            
-            for idx, element in enumerate(unique_elements):
+            for idx, raw in enumerate(raw_reviews):
                 try:
                     logger.debug(f"Processing review {idx + 1}")
                     
-                    # Extract reviewer name - updated selectors
+                    # Reviewer name: first candidate that is not the "More" button
                     reviewer_name = "Anonymous"
-                    name_selectors = [
-                        ".d4r55",
-                        "button.WEBjve",
-                        "div.WEBjve",
-                        "[data-review-id] button[aria-label]",
-                        ".kvMYJc",
-                        "a[href*='/contrib/']"
-                    ]
-                    
-                    for selector in name_selectors:
-                        try:
-                            name_elem = element.find_element(By.CSS_SELECTOR, selector)
-                            reviewer_name = name_elem.text.strip()
-                            if reviewer_name and reviewer_name != "More":
-                                logger.debug(f"Found reviewer name: {reviewer_name}")
-                                break
-                        except:
+                    for candidate in raw['names']:
+                        if candidate is None:
                             continue
+                        reviewer_name = candidate
+                        if reviewer_name and reviewer_name != "More":
+                            break
                     
-                    # Extract rating - updated approach
+                    # Rating from the aria-label, otherwise count filled stars
                     rating = 0
-                    try:
-                        # Try to find rating from aria-label
-                        rating_elem = element.find_element(By.CSS_SELECTOR, "[role='img'][aria-label*='star']")
-                        rating_text = rating_elem.get_attribute("aria-label")
-                        rating_match = re.search(r'(\d+)\s*star', rating_text)
+                    if raw['rating_label'] is not None:
+                        rating_match = _STAR_RE.search(raw['rating_label'])
                         if rating_match:
                             rating = float(rating_match.group(1))
-                            logger.debug(f"Found rating: {rating}")
-                    except:
-                        # Alternative: count filled stars
-                        try:
-                            filled_stars = element.find_elements(By.CSS_SELECTOR, ".hCCjke.vzX5Ic")  # Filled star class
-                            if filled_stars:
-                                rating = len(filled_stars)
-                                logger.debug(f"Found rating from star count: {rating}")
-                        except:
-                            pass
+                    elif raw['filled_stars']:
+                        rating = raw['filled_stars']
                     
-                    # Extract review text - updated selectors
+                    # Review text
                     review_text = ""
-                    text_selectors = [
-                        ".wiI7pd",
-                        ".MyEned",
-                        "span.wiI7pd",
-                        "[data-review-id] > div > div > div > span",
-                        ".Jtu6Td > span"
-                    ]
-                    
-                    for selector in text_selectors:
-                        try:
-                            # Try finding within the review element first
-                            text_elem = element.find_element(By.CSS_SELECTOR, selector)
-                            review_text = text_elem.text.strip()
-                            if review_text and review_text != "More" and len(review_text) > 5:
-                                logger.debug(f"Found review text: {review_text[:50]}...")
-                                break
-                        except:
+                    for candidate in raw['texts']:
+                        if candidate is None:
                             continue
+                        review_text = candidate
+                        if review_text and review_text != "More" and len(review_text) > 5:
+                            break
                     
-                    # Extract date - updated selectors
+                    # Review date
                     review_date = ""
-                    date_selectors = [
-                        ".rsqaWe",
-                        "span.rsqaWe",
-                        ".DU9Pgb > span",
-                        "[class*='fontBodyMedium'] span"
-                    ]
-                    
-                    for selector in date_selectors:
-                        try:
-                            date_elem = element.find_element(By.CSS_SELECTOR, selector)
-                            review_date = date_elem.text.strip()
-                            if review_date and any(time_word in review_date.lower() for time_word in ['ago', 'year', 'month', 'day', 'week']):
-                                logger.debug(f"Found review date: {review_date}")
-                                break
-                        except:
+                    for candidate in raw['dates']:
+                        if candidate is None:
                             continue
+                        review_date = candidate
+                        if review_date and _DATE_RE.search(review_date):
+                            break
                     
                     # Create unique key to avoid duplicates
                     review_key = f"{reviewer_name}|{rating}|{review_text[:50] if review_text else ''}|{review_date}"
+                    review_digest = xxhash.xxh3_64_intdigest(review_key.encode('utf-8'))
                     
                     # Only add review if we have meaningful data and it's not a duplicate
-                    if review_key not in seen_reviews and (rating > 0 or (review_text and len(review_text) > 5)):
-                        seen_reviews.add(review_key)
+                    if review_digest not in seen_reviews and (rating > 0 or (review_text and len(review_text) > 5)):
+                        seen_reviews.add(review_digest)
                         
                         # Create review object
                         review = Review(
@@ -530,14 +734,10 @@ class GoogleMapsScraper:
         
         # Search in different cities if provided
         if cities:
-            for city in cities:
-                logger.info(f"\n--- Searching {bank_name} in {city} ---")
-                self.search_bank(bank_name, city)
-                self.scroll_search_results()
-                branches = self.extract_branch_links(bank_name)
-                logger.info(f"Found {len(branches)} branches in {city}")
-                all_branches.extend(branches)
-                time.sleep(3)
+            workers = min(self.max_search_workers, len(cities))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for branches in executor.map(lambda city: self._search_city(bank_name, city), cities):
+                    all_branches.extend(branches)
         else:
             # General search
             logger.info(f"\n--- Searching {bank_name} (general) ---")
@@ -553,91 +753,221 @@ class GoogleMapsScraper:
                 seen_urls.add(branch.branch_url)
                 unique_branches.append(branch)
                 
+        if self.max_branches_per_bank:
+            unique_branches = unique_branches[:self.max_branches_per_bank]
+            
         logger.info(f"\nFound {len(unique_branches)} unique branches for {bank_name}")
         logger.info(f"Branch names: {[b.branch_name for b in unique_branches[:5]]}...")  # Show first 5
         
-        self.branches_collected.extend(unique_branches)
+        self._record_branches(unique_branches)
         
         # Visit each branch and collect reviews
         logger.info(f"\n--- Starting to collect reviews from {len(unique_branches)} branches ---")
         
+        # Skip branches scraped recently, then fetch over HTTP; the rest use the browser tabs
+        cached_reviews = self._load_cached_reviews(unique_branches) if self.use_cache else {}
+        stale_branches = [b for b in unique_branches if b.branch_url not in cached_reviews]
+        logger.info(f"{len(cached_reviews)} branches served from the review cache")
+        
+        http_reviews = GoogleMapsHTTPScraper().scrape(stale_branches) if self.use_http and stale_branches else {}
+        fallback_branches = [b for b in stale_branches if http_reviews.get(b.branch_url) is None]
+        browser_reviews = self.visit_branches_in_tabs(fallback_branches) if fallback_branches else {}
+        
         for i, branch in enumerate(unique_branches):
             logger.info(f"\n[{i+1}/{len(unique_branches)}] Processing: {branch.branch_name}")
             logger.info(f"  Address: {branch.address}")
             logger.info(f"  URL: {branch.branch_url[:80]}...")
             
-            try:
-                reviews = self.visit_branch_and_get_reviews(branch)
-                logger.info(f"  ✓ Collected {len(reviews)} reviews")
-                self.reviews_collected.extend(reviews)
-                
-                # Show sample of reviews collected
-                if reviews:
-                    logger.info(f"  Sample review: {reviews[0].reviewer_name} - {reviews[0].rating}★")
-                    
-            except Exception as e:
-                logger.error(f"  ✗ Error collecting reviews: {str(e)}")
-                
-            # Respect rate limits
-            time.sleep(5)
+            reviews = cached_reviews.get(branch.branch_url)
+            if reviews is None:
+                reviews = http_reviews.get(branch.branch_url)
+                if reviews is None:
+                    reviews = browser_reviews.get(branch.branch_url, [])
+                if self.use_cache:
+                    self._cache_reviews(branch, reviews)
+            logger.info(f"  ✓ Collected {len(reviews)} reviews")
+            self._record_reviews(reviews)
             
+            # Show sample of reviews collected
+            if reviews:
+                logger.info(f"  Sample review: {reviews[0].reviewer_name} - {reviews[0].rating}★")
+                
         logger.info(f"\n--- Completed {bank_name} ---")
-        logger.info(f"Total reviews for {bank_name}: {len([r for r in self.reviews_collected if r.bank_name == bank_name])}")
+        logger.info(f"Total reviews for {bank_name}: {self.review_counts[bank_name]}")
             
-    def save_data(self, final=False):
-        """Save both branches and reviews data"""
-        output_dir = Path("data/raw")
+    def _output_path(self, name: str, suffix: str, prefix: str = "progress_") -> Path:
+        """Path of a session output file in data/raw"""
+        output_dir = Path(__file__).resolve().parent / "data" / "raw"
         output_dir.mkdir(parents=True, exist_ok=True)
         
         # Use consistent timestamp for the entire session
         if not hasattr(self, 'session_timestamp'):
             self.session_timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             
-        timestamp = self.session_timestamp
+        return output_dir / f"{prefix}{name}_{self.session_timestamp}{suffix}"
+        
+    def _open_output(self, key: str, name: str, suffix: str, fieldnames: List[str] = None):
+        """
+        Open a streaming output on first use
+        
+        CSV outputs get a DictWriter with the header written; other outputs are opened
+        in binary mode for orjson-encoded lines.
+        """
+        if key not in self._outputs:
+            path = self._output_path(name, suffix)
+            writer = None
+            if not fieldnames:
+                handle = open(path, 'wb')
+            else:
+                handle = open(path, 'w', newline='', encoding='utf-8')
+                writer = csv.DictWriter(handle, fieldnames=fieldnames, lineterminator='\n')
+                writer.writeheader()
+            self._outputs[key] = (path, handle, writer)
+        return self._outputs[key]
+        
+    def _enqueue(self, kind: str, record: dict) -> None:
+        """Hand a row to the background writer, starting it on first use"""
+        if self._writer_thread is None:
+            self._writer_thread = threading.Thread(target=self._writer_loop, name="scraper-writer", daemon=True)
+            self._writer_thread.start()
+        self._write_queue.put((kind, record))
+        
+    def _record_branches(self, branches: List[BankBranch]) -> None:
+        """Queue branches for the branches CSV as soon as they are found"""
+        for branch in branches:
+            self._enqueue('branch', asdict(branch))
+            self.branch_counts[branch.bank_name] += 1
+            
+    def _record_reviews(self, reviews: List[Review]) -> None:
+        """Queue reviews for the reviews CSV and JSONL files instead of keeping them in memory"""
+        for review in reviews:
+            self._enqueue('review', asdict(review))
+            self.review_counts[review.bank_name] += 1
+            
+    def _writer_loop(self) -> None:
+        """Write queued rows in batches off the scraping thread until the None sentinel arrives"""
+        last_sync = time.monotonic()
+        while True:
+            batch = [self._write_queue.get()]
+            while len(batch) < self.WRITE_BATCH_SIZE:
+                try:
+                    batch.append(self._write_queue.get_nowait())
+                except queue.Empty:
+                    break
+                    
+            try:
+                self._write_batch([item for item in batch if item is not None])
+                if time.monotonic() - last_sync > self.FSYNC_INTERVAL:
+                    for _, handle, _ in self._outputs.values():
+                        handle.flush()
+                        os.fsync(handle.fileno())
+                    last_sync = time.monotonic()
+            except Exception as e:
+                logger.error(f"Error writing scraped rows: {str(e)}")
+                if self._write_error is None:
+                    self._write_error = e
+            finally:
+                for _ in batch:
+                    self._write_queue.task_done()
+                    
+            if None in batch:
+                return
+                
+    def _write_batch(self, batch: list) -> None:
+        """Append one batch of queued rows to the streaming outputs"""
+        branches = [record for kind, record in batch if kind == 'branch']
+        reviews = [record for kind, record in batch if kind == 'review']
+        
+        if branches:
+            _, _, writer = self._open_output('branches_file', "bank_branches", ".csv", BRANCH_FIELDS)
+            writer.writerows(branches)
+            
+        if reviews:
+            _, _, writer = self._open_output('reviews_file', "bank_reviews", ".csv", REVIEW_FIELDS)
+            _, jsonl, _ = self._open_output('reviews_json', "bank_reviews", ".jsonl")
+            writer.writerows(reviews)
+            jsonl.write(b"".join(orjson.dumps(record) + b"\n" for record in reviews))
+            
+    def _stop_writer(self) -> None:
+        """Drain the write queue and stop the background writer"""
+        if self._writer_thread is not None:
+            self._write_queue.put(None)
+            self._writer_thread.join()
+            self._writer_thread = None
+            
+    def save_data(self, final=False) -> Dict[str, str]:
+        """
+        Flush the streamed branches and reviews data, returning the paths of the CSV files
         
+        Rows are written while scraping under a progress_ prefix; a final save closes the
+        files and renames them with the final_ prefix picked up by the cleaning step.
+        """
         # Add prefix to differentiate progress saves from final saves
         prefix = "final_" if final else "progress_"
+        file_paths = {}
         
-        # Save branches
-        if self.branches_collected:
-            branches_df = pd.DataFrame([asdict(b) for b in self.branches_collected])
-            branches_file = output_dir / f"{prefix}bank_branches_{timestamp}.csv"
-            branches_df.to_csv(branches_file, index=False, encoding='utf-8')
-            logger.info(f"Saved {len(self.branches_collected)} branches to {branches_file}")
-            
-        # Save reviews
-        if self.reviews_collected:
-            reviews_df = pd.DataFrame([asdict(r) for r in self.reviews_collected])
-            reviews_file = output_dir / f"{prefix}bank_reviews_{timestamp}.csv"
-            reviews_df.to_csv(reviews_file, index=False, encoding='utf-8')
-            
-            # Also save as JSON
-            reviews_json = output_dir / f"{prefix}bank_reviews_{timestamp}.json"
-            with open(reviews_json, 'w', encoding='utf-8') as f:
-                json.dump([asdict(r) for r in self.reviews_collected], f, ensure_ascii=False, indent=2)
+        # Let the background writer finish every row queued so far
+        if final:
+            self._stop_writer()
+        else:
+            self._write_queue.join()
+            
+        # Rows were lost: keep the progress_ names so the cleaning step never reads them
+        if self._write_error is not None:
+            raise RuntimeError("Scraped rows could not be written, outputs are incomplete") from self._write_error
+            
+        for key, (path, handle, _) in list(self._outputs.items()):
+            if final:
+                handle.close()
+                final_path = path.with_name(path.name.replace("progress_", prefix, 1))
+                path.replace(final_path)
+                path = final_path
+                del self._outputs[key]
+            else:
+                handle.flush()
+            if key in ('branches_file', 'reviews_file'):
+                file_paths[key] = str(path)
                 
-            logger.info(f"Saved {len(self.reviews_collected)} reviews to {reviews_file}")
+        total_branches = sum(self.branch_counts.values())
+        total_reviews = sum(self.review_counts.values())
+        if 'branches_file' in file_paths:
+            logger.info(f"Saved {total_branches} branches to {file_paths['branches_file']}")
+            
+        if 'reviews_file' in file_paths:
+            logger.info(f"Saved {total_reviews} reviews to {file_paths['reviews_file']}")
             
             # Save a summary file
-            summary_file = output_dir / f"{prefix}scraping_summary_{timestamp}.txt"
+            summary_file = self._output_path("scraping_summary", ".txt", prefix)
             with open(summary_file, 'w', encoding='utf-8') as f:
                 f.write(f"Scraping Summary - {datetime.now()}\n")
                 f.write(f"{'='*50}\n")
-                f.write(f"Total branches found: {len(self.branches_collected)}\n")
-                f.write(f"Total reviews collected: {len(self.reviews_collected)}\n")
+                f.write(f"Total branches found: {total_branches}\n")
+                f.write(f"Total reviews collected: {total_reviews}\n")
                 f.write(f"\nBranches by bank:\n")
-                
-                bank_counts = {}
-                for branch in self.branches_collected:
-                    bank_counts[branch.bank_name] = bank_counts.get(branch.bank_name, 0) + 1
                     
-                for bank, count in bank_counts.items():
+                for bank, count in self.branch_counts.items():
                     f.write(f"  {bank}: {count} branches\n")
+        
+        return file_paths
             
     def close(self):
-        """Close the driver"""
+        """Close the driver, the parallel search browsers and any output still open"""
+        for helper in self._helper_scrapers:
+            helper.close()
+        self._helper_scrapers.clear()
+        
+        self._stop_writer()
+        for _, handle, _ in self._outputs.values():
+            handle.close()
+        self._outputs.clear()
+        
+        if self._cache_db is not None:
+            self._cache_db.close()
+            self._cache_db = None
+            
         if self.driver:
             self.driver.quit()
+            self.driver = None
             logger.info("Driver closed")
 
 
@@ -673,9 +1003,21 @@ MAJOR_CITIES = [
 # ]
 
 
-def main():
-    """Main execution function"""
-    scraper = GoogleMapsScraper(headless=True)
+def main(run_id: str = None, max_search_workers: int = SEARCH_MAX_WORKERS) -> Dict[str, str]:
+    """
+    Main execution function
+    
+    Args:
+        run_id: Timestamp used in the output file names (defaults to the start time)
+        max_search_workers: Chrome drivers used at once for the city searches
+        
+    Returns:
+        Paths of the branches and reviews files written
+    """
+    scraper = GoogleMapsScraper(headless=True, max_search_workers=max_search_workers)
+    if run_id:
+        scraper.session_timestamp = run_id
+    file_paths = {}
     
     try:
         scraper.setup_driver()
@@ -697,21 +1039,23 @@ def main():
             time.sleep(10)
             
         logger.info(f"\nScraping completed!")
-        logger.info(f"Total branches found: {len(scraper.branches_collected)}")
-        logger.info(f"Total reviews collected: {len(scraper.reviews_collected)}")
+        logger.info(f"Total branches found: {sum(scraper.branch_counts.values())}")
+        logger.info(f"Total reviews collected: {sum(scraper.review_counts.values())}")
         
         # Save final data only once at the end
-        scraper.save_data(final=True)
+        file_paths = scraper.save_data(final=True)
     
         
     except Exception as e:
         logger.error(f"Error in main execution: {str(e)}")
         # Save whatever data we have
-        scraper.save_data(final=True)
+        file_paths = scraper.save_data(final=True)
         scraper.close()
         
     finally:
         scraper.close()
+        
+    return file_paths
 
 
 def test_single_branch():
@@ -6,37 +6,114 @@ import pandas as pd
 import numpy as np
 from sqlalchemy import create_engine, text
 import nltk
-from textblob import TextBlob
-from sklearn.feature_extraction.text import TfidfVectorizer, CountVectorizer
-from sklearn.decomposition import LatentDirichletAllocation
+from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+from sklearn.feature_extraction.text import TfidfVectorizer
 import gensim
-from gensim import corpora
+from gensim import corpora, matutils
 import logging
+import os
+from collections import Counter
 import json
+import re
+import hashlib
+from functools import lru_cache
 
-# Download required NLTK data
-nltk.download('stopwords')
-nltk.download('punkt')
-nltk.download('punkt_tab')
-nltk.download('wordnet')
+from joblib import Parallel, delayed
+
+from load_to_postgres import USE_COPY, psql_insert_copy, psql_insert_values
 
 from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
 from nltk.stem import WordNetLemmatizer
 
 logger = logging.getLogger(__name__)
 
+# Words of 4+ letters (accents included); shorter tokens are dropped from topics anyway
+TOKEN_RE = re.compile(r"[a-zàâäçéèêëîïôöûùüÿñæœ]{4,}")
+
+# VADER's recommended compound-score cut-offs for positive / negative text
+POSITIVE_THRESHOLD = 0.05
+NEGATIVE_THRESHOLD = -0.05
+
+READ_CHUNK_SIZE = 50_000  # Reviews streamed from Postgres per chunk
+PREPROCESS_BATCH_SIZE = 512  # Reviews per joblib task when preprocessing in parallel
+LDA_HASH_BUCKETS = 2 ** 17  # Hashed unigram/bigram columns fed to LDA (~30k distinct terms)
+
+# WordNet always maps a word to the same lemma, so repeated words hit the cache
+_lemmatize = lru_cache(maxsize=200_000)(WordNetLemmatizer().lemmatize)
+
+def term_hash(token):
+    """
+    Hash a UTF-8 term for the LDA HashDictionary
+    
+    gensim's default adler32 is close to a byte sum on short words, so unrelated
+    terms share buckets; blake2b spreads them evenly.
+    """
+    return int.from_bytes(hashlib.blake2b(token, digest_size=8).digest(), 'little')
+
+def preprocess_text(text, stop_words):
+    """Tokenize, drop stopwords and lemmatize a review (module level so joblib workers can run it)"""
+    # Tokenize into words longer than 3 letters
+    tokens = TOKEN_RE.findall(text.lower())
+    # Remove stopwords and lemmatize
+    return ' '.join(_lemmatize(t) for t in tokens if t not in stop_words)
+
 class ReviewAnalyzer:
     def __init__(self, db_config):
         self.engine = create_engine(
             f"postgresql://{db_config['user']}:{db_config['password']}@"
             f"{db_config['host']}:{db_config['port']}/{db_config['database']}"
         )
-        self.stop_words = set(stopwords.words('english') + stopwords.words('french'))
-        self.lemmatizer = WordNetLemmatizer()
+        # Download required NLTK data here rather than at import, which joblib workers repeat
+        nltk.download('stopwords')
+        nltk.download('wordnet')
+        
+        self.stop_words = frozenset(stopwords.words('english') + stopwords.words('french'))
+        self.sentiment_analyzer = SentimentIntensityAnalyzer()
+        
+    def _read_sql_chunks(self, query, params=None):
+        """Stream query results through a server-side cursor, READ_CHUNK_SIZE rows at a time"""
+        with self.engine.connect().execution_options(stream_results=True) as conn:
+            yield from pd.read_sql(text(query), conn, params=params, chunksize=READ_CHUNK_SIZE)
+        
+    def _replace_table_rows(self, chunks, table_name, create_table_sql):
+        """
+        Swap the rows of an analytics table for the DataFrame chunks in one transaction
+        
+        TRUNCATE + COPY keeps the table definition (primary key, defaults) that
+        to_sql(if_exists='replace') would drop. With USE_COPY off the rows go in
+        as batched execute_values INSERTs instead. Each chunk is written as soon
+        as it is produced and then dropped; the number of rows written is returned.
+        """
+        written = 0
+        with self.engine.begin() as conn:
+            conn.execute(text(create_table_sql))
+            conn.execute(text(f"TRUNCATE analytics.{table_name}"))
+            for df in chunks:
+                df.to_sql(table_name, conn, schema='analytics', if_exists='append', index=False,
+                          method=psql_insert_copy if USE_COPY else psql_insert_values)
+                written += len(df)
+        return written
+        
+    def _score_sentiment(self, review_text):
+        """
+        Return (polarity, subjectivity) of a review, or NaNs if VADER fails on it
+        
+        Polarity is VADER's compound score; subjectivity is the share of the text
+        carrying sentiment (1 - neutral proportion).
+        """
+        try:
+            scores = self.sentiment_analyzer.polarity_scores(review_text)
+            return scores['compound'], 1 - scores['neu']
+        except Exception:
+            return np.nan, np.nan
         
     def analyze_sentiment(self):
-        """Perform sentiment analysis on reviews"""
+        """
+        Perform sentiment analysis on reviews
+        
+        The per-review results go to analytics.sentiment_analysis; only the number of
+        reviews per sentiment label is returned, so memory does not grow with the reviews.
+        """
         logger.info("Starting sentiment analysis...")
         
         # Load reviews
@@ -45,75 +122,94 @@ class ReviewAnalyzer:
         FROM staging.stg_reviews 
         WHERE review_text IS NOT NULL AND LENGTH(review_text) > 10
         """
-        df = pd.read_sql(query, self.engine)
-        
-        # Analyze sentiment
-        sentiments = []
-        for idx, row in df.iterrows():
-            try:
-                blob = TextBlob(row['review_text'])
-                polarity = blob.sentiment.polarity
-                subjectivity = blob.sentiment.subjectivity
-                
-                # Classify sentiment
-                if polarity > 0.1:
-                    sentiment_label = 'positive'
-                elif polarity < -0.1:
-                    sentiment_label = 'negative'
-                else:
-                    sentiment_label = 'neutral'
-                
-                # Consider rating as well
-                if row['rating'] >= 4 and sentiment_label == 'neutral':
-                    sentiment_label = 'positive'
-                elif row['rating'] <= 2 and sentiment_label == 'neutral':
-                    sentiment_label = 'negative'
-                
-                sentiments.append({
-                    'review_id': row['id'],
-                    'sentiment_label': sentiment_label,
-                    'polarity_score': polarity,
-                    'subjectivity_score': subjectivity
-                })
-                
-            except Exception as e:
-                logger.warning(f"Error analyzing review {row['id']}: {str(e)}")
-                sentiments.append({
-                    'review_id': row['id'],
-                    'sentiment_label': 'neutral',
-                    'polarity_score': 0,
-                    'subjectivity_score': 0
-                })
         
-        # Save to database
-        sentiment_df = pd.DataFrame(sentiments)
+        label_counts = Counter()
         
-        # Create sentiment analysis table
-        with self.engine.connect() as conn:
-            conn.execute(text("""
-                CREATE TABLE IF NOT EXISTS analytics.sentiment_analysis (
-                    review_id INTEGER PRIMARY KEY,
-                    sentiment_label VARCHAR(20),
-                    polarity_score FLOAT,
-                    subjectivity_score FLOAT,
-                    analyzed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """))
-            conn.commit()
+        def labelled_chunks():
+            for df in self._read_sql_chunks(query):
+                sentiment_df = self._label_sentiment(df)
+                label_counts.update(sentiment_df['sentiment_label'].value_counts().to_dict())
+                yield sentiment_df
         
-        sentiment_df.to_sql('sentiment_analysis', self.engine, schema='analytics',
-                          if_exists='replace', index=False)
+        # Create sentiment analysis table and replace its rows chunk by chunk
+        total = self._replace_table_rows(labelled_chunks(), 'sentiment_analysis', """
+            CREATE TABLE IF NOT EXISTS analytics.sentiment_analysis (
+                review_id INTEGER PRIMARY KEY,
+                sentiment_label VARCHAR(20),
+                polarity_score FLOAT,
+                subjectivity_score FLOAT,
+                analyzed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
         
-        logger.info(f"Sentiment analysis completed for {len(sentiment_df)} reviews")
+        logger.info(f"Sentiment analysis completed for {total} reviews")
         
         # Log summary
-        summary = sentiment_df['sentiment_label'].value_counts()
+        summary = pd.Series(dict(label_counts.most_common()), name='count', dtype='int64')
         logger.info(f"Sentiment distribution:\n{summary}")
         
-        return sentiment_df
+        return summary
+    
+    def _label_sentiment(self, df):
+        """Score and label one chunk of reviews, returning its sentiment_analysis rows"""
+        # Analyze sentiment: one VADER pass per review, NaN where it failed
+        scores = pd.DataFrame(
+            df['review_text'].map(self._score_sentiment).tolist(),
+            columns=['polarity', 'subjectivity'], index=df.index
+        )
+        failed = scores['polarity'].isna().to_numpy()
+        if failed.any():
+            logger.warning(f"Error analyzing reviews {df.loc[failed, 'id'].tolist()}")
+        polarity = scores['polarity'].fillna(0).to_numpy()
+        subjectivity = scores['subjectivity'].fillna(0).to_numpy()
+        
+        # Classify sentiment
+        sentiment_label = np.select(
+            [polarity >= POSITIVE_THRESHOLD, polarity <= NEGATIVE_THRESHOLD], ['positive', 'negative'], default='neutral'
+        )
+        
+        # Consider rating as well for neutral texts (reviews that failed stay neutral)
+        rating = df['rating'].to_numpy(dtype=float)
+        neutral = (sentiment_label == 'neutral') & ~failed
+        sentiment_label = np.where(neutral & (rating >= 4), 'positive',
+                                   np.where(neutral & (rating <= 2), 'negative', sentiment_label))
+        
+        return pd.DataFrame({
+            'review_id': df['id'].to_numpy(),
+            'sentiment_label': sentiment_label,
+            'polarity_score': polarity,
+            'subjectivity_score': subjectivity
+        })
+    
+    def _topic_corpus(self, df, id2word):
+        """Preprocess one chunk of reviews into token lists and hashed unigram + bigram bags of words"""
+        # Preprocess text across all cores
+        processed = Parallel(n_jobs=-1, batch_size=PREPROCESS_BATCH_SIZE, backend='loky')(
+            delayed(preprocess_text)(review_text, self.stop_words) for review_text in df['review_text']
+        )
+        
+        token_lists = []
+        for processed_text in processed:
+            tokens = processed_text.split()
+            token_lists.append(tokens + [' '.join(pair) for pair in zip(tokens, tokens[1:])])
+        
+        return token_lists, [id2word.doc2bow(tokens) for tokens in token_lists]
+    
+    def _count_hashed_terms(self, hasher, token_lists, counts):
+        """Count, per hashed term id in counts, the tokens that hash to it"""
+        for tokens in token_lists:
+            for token in tokens:
+                term_id = hasher.restricted_hash(token)
+                if term_id in counts:
+                    counts[term_id][token] += 1
     
     def extract_topics(self, n_topics=10, sentiment_filter=None):
-        """Extract topics using LDA"""
+        """
+        Extract topics using LDA
+        
+        Returns the topics and the number of reviews per primary topic; the
+        per-review assignments go to analytics.review_topics.
+        """
         logger.info(f"Starting topic extraction (n_topics={n_topics})...")
         
         # Load reviews with sentiment if available
@@ -123,46 +219,64 @@ class ReviewAnalyzer:
         FROM staging.stg_reviews r
         LEFT JOIN analytics.sentiment_analysis s ON r.id = s.review_id
         WHERE r.review_text IS NOT NULL AND LENGTH(r.review_text) > 20
+          AND (CAST(:sentiment_filter AS VARCHAR) IS NULL OR s.sentiment_label = :sentiment_filter)
         """
+        params = {'sentiment_filter': sentiment_filter or None}
         
-        if sentiment_filter:
-            query += f" AND s.sentiment_label = '{sentiment_filter}'"
-            
-        df = pd.read_sql(query, self.engine)
-        
-        # Preprocess text
-        def preprocess_text(text):
-            # Tokenize
-            tokens = word_tokenize(text.lower())
-            # Remove stopwords and short words
-            tokens = [t for t in tokens if t not in self.stop_words and len(t) > 3]
-            # Lemmatize
-            tokens = [self.lemmatizer.lemmatize(t) for t in tokens]
-            return ' '.join(tokens)
-        
-        df['processed_text'] = df['review_text'].apply(preprocess_text)
-        
-        # Create document-term matrix
-        vectorizer = CountVectorizer(max_features=100, ngram_range=(1, 2))
-        doc_term_matrix = vectorizer.fit_transform(df['processed_text'])
-        
-        # LDA model
-        lda = LatentDirichletAllocation(
-            n_components=n_topics,
-            max_iter=50,
-            learning_method='online',
+        # LDA model over hashed terms (no vocabulary to build), trained across all but one core
+        id2word = corpora.HashDictionary(id_range=LDA_HASH_BUCKETS, myhash=term_hash, debug=False)
+        lda = gensim.models.LdaMulticore(
+            num_topics=n_topics,
+            id2word=id2word,
+            workers=max(1, (os.cpu_count() or 2) - 1),
+            passes=10,
+            chunksize=2000,
             random_state=42
         )
-        lda.fit(doc_term_matrix)
         
-        # Extract topics
-        feature_names = vectorizer.get_feature_names_out()
+        # First pass: train online, one streamed chunk of reviews at a time
+        for df in self._read_sql_chunks(query, params):
+            lda.update(self._topic_corpus(df, id2word)[1])
+        
+        topic_terms = [lda.get_topic_terms(topic_idx, topn=10) for topic_idx in range(n_topics)]
+        term_counts = {term_id: Counter() for terms in topic_terms for term_id, _ in terms}
+        topic_counts = Counter()
+        
+        # Second pass: assign topics to documents, writing each chunk as it is scored
+        def doc_topic_chunks():
+            for df in self._read_sql_chunks(query, params):
+                token_lists, corpus = self._topic_corpus(df, id2word)
+                self._count_hashed_terms(id2word, token_lists, term_counts)
+                doc_topics = matutils.corpus2dense(
+                    lda.get_document_topics(corpus, minimum_probability=0), num_terms=n_topics
+                ).T
+                primary_topic = doc_topics.argmax(axis=1)
+                topic_counts.update(primary_topic.tolist())
+                yield pd.DataFrame({
+                    'review_id': df['id'].to_numpy(),
+                    'primary_topic': primary_topic,
+                    'topic_score': doc_topics.max(axis=1)
+                })
+        
+        # Save document-topic associations
+        self._replace_table_rows(doc_topic_chunks(), 'review_topics', """
+            CREATE TABLE IF NOT EXISTS analytics.review_topics (
+                review_id INTEGER PRIMARY KEY,
+                primary_topic INTEGER,
+                topic_score FLOAT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        topic_sizes = pd.Series(topic_counts, name='review_count', dtype='int64').sort_index()
+        
+        # Extract topics, showing each hashed term as the most frequent token behind it
+        term_words = {term_id: c.most_common(1)[0][0] if c else str(term_id)
+                      for term_id, c in term_counts.items()}
         topics = []
         
-        for topic_idx, topic in enumerate(lda.components_):
-            top_indices = topic.argsort()[-10:][::-1]
-            top_words = [feature_names[i] for i in top_indices]
-            top_weights = [topic[i] for i in top_indices]
+        for topic_idx, terms in enumerate(topic_terms):
+            top_words = [term_words[term_id] for term_id, _ in terms]
+            top_weights = [weight for _, weight in terms]
             
             topics.append({
                 'topic_id': topic_idx,
@@ -194,33 +308,9 @@ class ReviewAnalyzer:
         topics_df.to_sql('topics', self.engine, schema='analytics',
                         if_exists='append', index=False)
         
-        # Assign topics to documents
-        doc_topics = lda.transform(doc_term_matrix)
-        df['primary_topic'] = doc_topics.argmax(axis=1)
-        df['topic_score'] = doc_topics.max(axis=1)
-        
-        # Save document-topic associations
-        doc_topic_df = df[['id', 'primary_topic', 'topic_score']]
-        
-        with self.engine.connect() as conn:
-            conn.execute(text("""
-                CREATE TABLE IF NOT EXISTS analytics.review_topics (
-                    review_id INTEGER PRIMARY KEY,
-                    primary_topic INTEGER,
-                    topic_score FLOAT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """))
-            conn.commit()
-        
-        doc_topic_df.rename(columns={'id': 'review_id'}).to_sql(
-            'review_topics', self.engine, schema='analytics',
-            if_exists='replace', index=False
-        )
-        
         logger.info(f"Topic extraction completed: {n_topics} topics identified")
         
-        return topics_df, df
+        return topics_df, topic_sizes
 
 def main():
     """Run NLP analysis pipeline"""
@@ -235,7 +325,7 @@ def main():
     analyzer = ReviewAnalyzer(db_config)
     
     # Run sentiment analysis
-    sentiment_df = analyzer.analyze_sentiment()
+    analyzer.analyze_sentiment()
     
     # Extract topics for different sentiments
     analyzer.extract_topics(n_topics=10, sentiment_filter='positive')
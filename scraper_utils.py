@@ -2,21 +2,115 @@
 """
 Reusable scraper utilities extracted from the main scraper
 """
+import re
+import html
 import time
+import asyncio
 import logging
+from typing import Dict, List, Optional
+import httpx
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.options import Options
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
+from selenium.common.exceptions import TimeoutException, NoSuchElementException, WebDriverException
 
 logger = logging.getLogger(__name__)
 
+# Shared by every plain-HTTPS path to Google Maps (place pages here, reviews in the scraper)
+FEATURE_ID_RE = re.compile(r'!1s(0x[0-9a-f]+):(0x[0-9a-f]+)')  # Place feature ID in a Maps URL
+HTTP_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+        "(KHTML, like Gecko) Chrome/125.0 Safari/537.36"
+    ),
+    "Accept-Language": "en"
+}
+
+
+def http_client(max_connections: int) -> httpx.AsyncClient:
+    """HTTP/2 client keeping every connection alive, so requests reuse the same TLS sessions"""
+    limits = httpx.Limits(max_connections=max_connections,
+                          max_keepalive_connections=max_connections)
+    return httpx.AsyncClient(http2=True, limits=limits, headers=HTTP_HEADERS,
+                             timeout=20, follow_redirects=True)
+
+
+class GoogleMapsHTTPUtils:
+    """
+    Fetch branch details over plain HTTPS from the place page, without a browser.
+    
+    The server-rendered place page carries "Name · Address" in its title meta tag
+    and the phone number as a ``tel:`` link. URLs whose page does not match are
+    reported as ``None`` so the caller can fall back to Selenium.
+    """
+    
+    ADDRESS_RE = re.compile(
+        r'<meta content="[^"]*? · ([^"]+)" (?:itemprop="name"|property="og:title")'
+    )
+    PHONE_RE = re.compile(r'tel:(\+?\d[\d -]{5,}\d)')
+    
+    def __init__(self, max_concurrency: int = 8, request_delay: float = 0.5):
+        self.max_concurrency = max_concurrency  # Place pages fetched at the same time
+        self.request_delay = request_delay  # Seconds a slot waits before its next page
+        
+    def get_addresses(self, urls: List[str]) -> Dict[str, Optional[dict]]:
+        """Fetch the details of all URLs concurrently, keyed by URL"""
+        return asyncio.run(self._get_all(urls))
+        
+    async def _get_all(self, urls: List[str]) -> Dict[str, Optional[dict]]:
+        # At most max_concurrency pages in flight, so timeouts under load do not push
+        # URLs to the much slower browser fallback and Google is not sent a burst
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        
+        async def get_limited(url: str) -> Optional[dict]:
+            async with semaphore:
+                result = await self.get_address(client, url)
+                await asyncio.sleep(self.request_delay)
+                return result
+        
+        async with http_client(self.max_concurrency) as client:
+            results = await asyncio.gather(*(get_limited(url) for url in urls))
+        return dict(zip(urls, results))
+        
+    async def get_address(self, client: httpx.AsyncClient, url: str) -> Optional[dict]:
+        """Return the branch details, or None if the place page could not provide an address"""
+        # Only place URLs (with a feature ID) render a single place server-side
+        if not FEATURE_ID_RE.search(url):
+            return None
+        
+        try:
+            response = await client.get(url)
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            logger.warning(f"HTTP address fetch failed for {url}: {str(e)}")
+            return None
+        
+        address_match = self.ADDRESS_RE.search(response.text)
+        if not address_match:
+            return None
+        phone_match = self.PHONE_RE.search(response.text)
+        
+        return {
+            'url': url,
+            'address': html.unescape(address_match.group(1)).strip(),
+            'phone': phone_match.group(1) if phone_match else None,
+            'scraped_at': time.strftime('%Y-%m-%d %H:%M:%S')
+        }
+
 
 class GoogleMapsUtils:
     """Utility class for Google Maps scraping operations"""
     
+    # All address variants as one selector group, matched with a single find_elements call
+    ADDRESS_SELECTOR = ", ".join([
+        "button[data-item-id='address']",
+        "button[aria-label*='Address:']",
+        "[data-tooltip='Copy address']",
+        "[data-item-id='address'] .Io6YTe"  # Direct address text (other info rows share .Io6YTe)
+    ])
+    
     def __init__(self, headless: bool = True):
         self.headless = headless
         self.driver = None
@@ -31,42 +125,52 @@ class GoogleMapsUtils:
         chrome_options.add_argument("--disable-blink-features=AutomationControlled")
         chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
         chrome_options.add_experimental_option('useAutomationExtension', False)
-        chrome_options.add_argument("--window-size=1920,1080")
+        # Small viewport: only the DOM text is read, lazy content is driven by scrollTop
+        chrome_options.add_argument("--window-size=800,600")
+        chrome_options.add_argument("--hide-scrollbars")
+        chrome_options.add_argument("--mute-audio")
+        chrome_options.add_argument("--disable-gpu")
+        chrome_options.add_argument("--disable-extensions")
+        # Only the DOM text is needed: skip images and return after DOMContentLoaded
+        chrome_options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+        chrome_options.page_load_strategy = "eager"
         
         self.driver = webdriver.Chrome(options=chrome_options)
+        # Lookups must not block on misses; waiting is done explicitly with WebDriverWait
+        self.driver.implicitly_wait(0)
         self.driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
         
     def get_address_from_url(self, url: str) -> dict:
         """Extract address and other details from a Google Maps URL"""
         try:
             self.driver.get(url)
-            time.sleep(3)  # Wait for page to load
             
-            # Try multiple selectors for address
-            address_selectors = [
-                "button[data-item-id='address']",
-                "button[aria-label*='Address:']",
-                "[data-tooltip='Copy address']",
-                "div.rogA2c .Io6YTe"  # Direct address text
-            ]
+            # Wait until any address variant is rendered instead of sleeping a fixed time
+            try:
+                WebDriverWait(self.driver, 10).until(
+                    EC.presence_of_element_located((By.CSS_SELECTOR, self.ADDRESS_SELECTOR))
+                )
+            except TimeoutException:
+                logger.warning(f"Timeout waiting for address on {url}")
             
             address = None
-            for selector in address_selectors:
+            for element in self.driver.find_elements(By.CSS_SELECTOR, self.ADDRESS_SELECTOR):
                 try:
-                    element = self.driver.find_element(By.CSS_SELECTOR, selector)
-                    
                     # Try to get from aria-label first
                     aria_label = element.get_attribute('aria-label')
                     if aria_label and 'Address:' in aria_label:
                         address = aria_label.replace('Address:', '').strip()
                         break
                     
-                    # Otherwise get text content
-                    address_elem = element.find_element(By.CSS_SELECTOR, ".Io6YTe")
-                    if address_elem:
-                        address = address_elem.text.strip()
+                    # Otherwise get text content, the element itself being the direct address text
+                    address_elems = element.find_elements(By.CSS_SELECTOR, ".Io6YTe")
+                    if address_elems:
+                        address = address_elems[0].text.strip()
+                        break
+                    if 'Io6YTe' in (element.get_attribute('class') or ''):
+                        address = element.text.strip()
                         break
-                except:
+                except WebDriverException:
                     continue
                     
             # Also try to get phone number and hours
@@ -0,0 +1,127 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from data_cleaning_pipeline import DataCleaningPipeline
+
+
+@pytest.fixture
+def pipeline(tmp_path):
+    raw_file = tmp_path / "final_bank_reviews_test.csv"
+    return DataCleaningPipeline(branches_file=str(raw_file), reviews_file=str(raw_file))
+
+
+# Expected values are those of the original row-by-row implementations
+@pytest.mark.parametrize("review_date, scraped_at, expected", [
+    ("a month ago", "2025-06-04T10:48:50", "2025-05-04"),
+    ("3 years ago", "2025-06-04T10:48:50", "2022-06-04"),
+    ("2 weeks ago", "2025-06-04T10:48:50", "2025-05-21"),
+    ("5 days ago", "2025-06-04T10:48:50", "2025-05-30"),
+    ("an hour ago", "2025-06-04T10:48:50", "2025-06-04"),
+    ("11 hours ago", "2025-06-04T10:48:50", "2025-06-03"),
+    ("yesterday", "2025-06-04T10:48:50", "2025-06-03"),
+    ("today", "2025-06-04T10:48:50", "2025-06-04"),
+    ("", "2025-06-04T10:48:50", "2025-06-04"),
+    (None, "2025-06-04T10:48:50", "2025-06-04"),
+    ("Edited 2 months ago", "2025-06-04T10:48:50", "2025-06-04"),
+    ("a month ago", "2025-03-31T09:00:00", "2025-02-28"),
+    ("a year ago", "2024-02-29T09:00:00", "2023-02-28"),
+])
+def test_normalize_review_dates(pipeline, review_date, scraped_at, expected):
+    reviews_df = pd.DataFrame({'review_date': [review_date], 'scraped_at': [scraped_at]})
+
+    result = pipeline.normalize_review_dates(reviews_df)
+
+    assert result['review_date_normalized'].dt.strftime('%Y-%m-%d').tolist() == [expected]
+    assert result['review_year'].tolist() == [int(expected[:4])]
+    assert result['review_month'].tolist() == [int(expected[5:7])]
+
+
+@pytest.mark.parametrize("review_text, kept", [
+    ("Great service", True),
+    ("abc", True),
+    ("très bien", True),
+    ("ok", False),
+    ("👍👍👍", False),
+    ("!!!", False),
+    ("12345", False),
+    ("   \n ", False),
+    ("", False),
+    (np.nan, False),
+])
+def test_clean_review_text(pipeline, review_text, kept):
+    reviews_df = pd.DataFrame({'review_text': [review_text]})
+
+    assert len(pipeline.clean_review_text(reviews_df)) == int(kept)
+
+
+def test_update_branch_addresses(pipeline):
+    pipeline.url_address_map = {
+        'https://maps.example/1': '1 Rue X, Casablanca',
+        'https://maps.example/2': '',
+        'https://maps.example/3': None,
+    }
+    reviews_df = pd.DataFrame({
+        'branch_url': ['https://maps.example/1', 'https://maps.example/2',
+                       'https://maps.example/3', 'https://maps.example/4'],
+        'branch_address': ['old 1', 'old 2', 'old 3', np.nan],
+    })
+
+    result = pipeline.update_branch_addresses(reviews_df)
+
+    assert result['branch_address'].tolist()[:3] == ['1 Rue X, Casablanca', 'old 2', 'old 3']
+    assert pd.isna(result['branch_address'].iloc[3])
+
+
+def test_text_column_empty_in_first_chunk_keeps_string_type(tmp_path):
+    reviews_file = tmp_path / "final_bank_reviews_test.csv"
+    pd.DataFrame({
+        'bank_name': ['Bank A'] * 4,
+        'branch_name': ['Branch 1'] * 4,
+        'branch_address': [None, None, '1 Rue X', None],
+        'branch_url': ['https://maps.example/1'] * 4,
+        'reviewer_name': ['a', 'b', 'c', 'd'],
+        'rating': [5.0, 4.0, 1.0, 3.0],
+        'review_text': ['good', 'fine', 'bad', 'ok'],
+        'review_date': ['a month ago'] * 4,
+        'helpful_count': [0, 1, 2, 0],
+        'response_from_owner': [None, None, 'thanks', None],
+        'scraped_at': ['2025-06-04T10:48:50'] * 4,
+    }).to_csv(reviews_file, index=False)
+    pipeline = DataCleaningPipeline(branches_file=str(reviews_file), reviews_file=str(reviews_file))
+    output_file = tmp_path / "reviews_cleaned.parquet"
+
+    writer = None
+    try:
+        for chunk in pipeline._read_review_chunks(chunksize=2):
+            writer = DataCleaningPipeline._write_parquet_chunk(writer, chunk, output_file)
+    finally:
+        writer.close()
+
+    table = pq.read_table(output_file)
+    assert table.schema.field('response_from_owner').type == pa.string()
+    assert table.column('response_from_owner').to_pylist() == [None, None, 'thanks', None]
+    assert table.column('branch_address').to_pylist() == [None, None, '1 Rue X', None]
+
+
+def test_later_chunk_with_more_categories_fits_writer_schema(tmp_path):
+    output_file = tmp_path / "reviews_cleaned.parquet"
+    branch_names = [['Branch 1', 'Branch 2'], [f'Branch {i}' for i in range(300)]]
+
+    writer = None
+    try:
+        for names in branch_names:
+            chunk = pd.DataFrame({
+                'bank_name': pd.Series(['Bank A'] * len(names), dtype='category'),
+                'branch_name': pd.Series(names, dtype='category'),
+                'rating': [5.0] * len(names),
+            })
+            writer = DataCleaningPipeline._write_parquet_chunk(writer, chunk, output_file)
+    finally:
+        writer.close()
+
+    table = pq.read_table(output_file)
+    assert table.num_rows == 302
+    assert table.column('branch_name').to_pylist()[-1] == 'Branch 299'